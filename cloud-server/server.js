@@ -1,13 +1,25 @@
 const express = require('express');
 const cors = require('cors');
 const fs = require('fs');
+const os = require('os');
 const path = require('path');
-const { exec } = require('child_process');
-const { promisify } = require('util');
+const { spawn } = require('child_process');
 
 const app = express();
 const port = process.env.PORT || 3000;
-const execAsync = promisify(exec);
+
+function envInt(name, fallback) {
+  const value = parseInt(process.env[name], 10);
+  return Number.isNaN(value) ? fallback : value;
+}
+
+// Conversion limits (override through the environment)
+const MAX_CONCURRENT_JOBS = Math.max(1, envInt('MAX_CONCURRENT_JOBS', os.cpus().length));
+const MAX_QUEUED_JOBS = Math.max(0, envInt('MAX_QUEUED_JOBS', 32));
+const MAX_UPLOAD_BYTES = envInt('MAX_UPLOAD_BYTES', 500 * 1024 * 1024);
+const CONVERT_TIMEOUT_MS = envInt('CONVERT_TIMEOUT_MS', 300000);
+const MP3_BITRATE = process.env.MP3_BITRATE || '192k';
+const HOLD_BYTES = 64 * 1024; // Output buffered before the 200 status is committed
 
 // Try to get FFmpeg path
 let ffmpegPath = 'ffmpeg'; // Default fallback
@@ -20,8 +32,38 @@ try {
 }
 
 // Middleware
+// No body parser: /api/convert streams the request straight into ffmpeg
 app.use(cors());
-app.use(express.raw({ type: 'audio/*', limit: '50mb' }));
+
+// Job slots: at most MAX_CONCURRENT_JOBS ffmpeg processes, the rest wait in FIFO order
+let runningJobs = 0;
+const waitingJobs = [];
+
+function acquireSlot() {
+  if (runningJobs < MAX_CONCURRENT_JOBS) {
+    runningJobs++;
+    return { ready: Promise.resolve(), cancel: () => {} };
+  }
+  let wake;
+  const ready = new Promise(resolve => {
+    wake = resolve;
+    waitingJobs.push(wake);
+  });
+  const cancel = () => {
+    const index = waitingJobs.indexOf(wake);
+    if (index !== -1) waitingJobs.splice(index, 1);
+  };
+  return { ready, cancel };
+}
+
+function releaseSlot() {
+  const next = waitingJobs.shift();
+  if (next) {
+    next(); // Hand the slot straight to the next job
+  } else {
+    runningJobs--;
+  }
+}
 
 // Health check endpoint
 app.get('/api/health', (req, res) => {
@@ -30,6 +72,12 @@ app.get('/api/health', (req, res) => {
     message: 'Audio converter API is running',
     timestamp: new Date().toISOString(),
     ffmpeg: ffmpegPath,
+    jobs: {
+      running: runningJobs,
+      queued: waitingJobs.length,
+      maxConcurrent: MAX_CONCURRENT_JOBS,
+      maxQueued: MAX_QUEUED_JOBS
+    },
     endpoints: {
       convert: '/api/convert (POST)',
       health: '/api/health (GET)'
@@ -37,71 +85,187 @@ app.get('/api/health', (req, res) => {
   });
 });
 
-// Convert endpoint
-app.post('/api/convert', async (req, res) => {
-  try {
-    console.log('🎵 Audio conversion request received');
-    
-    const buffer = req.body;
-    
-    if (!buffer || buffer.length === 0) {
-      return res.status(400).json({ error: 'No audio data received' });
-    }
+function sendError(res, status, error, details) {
+  if (res.headersSent) {
+    // Part of the MP3 is already out; cut the response so the client sees it is incomplete
+    res.destroy();
+  } else if (!res.writableEnded) {
+    res.status(status).json({ error, details });
+  }
+}
 
-    console.log(`📁 Received audio file: ${buffer.length} bytes`);
-
-    // Create temporary file paths
-    const tempDir = process.platform === 'win32' ? process.env.TEMP || 'C:\\temp' : '/tmp';
-    const inputPath = path.join(tempDir, `input_${Date.now()}.m4a`);
-    const outputPath = path.join(tempDir, `output_${Date.now()}.mp3`);
-
-    // Write input file
-    fs.writeFileSync(inputPath, buffer);
-    console.log(`💾 Saved input file: ${inputPath}`);
-
-    // Convert using FFmpeg command
-    const ffmpegCommand = `"${ffmpegPath}" -y -i "${inputPath}" -vn -acodec libmp3lame -b:a 192k "${outputPath}"`;
-    console.log('🎛️ FFmpeg command:', ffmpegCommand);
-    
-    try {
-      const { stdout, stderr } = await execAsync(ffmpegCommand, { timeout: 30000 });
-      console.log('✅ Conversion completed');
-      if (stderr) console.log('FFmpeg stderr:', stderr);
-    } catch (execError) {
-      console.error('❌ FFmpeg execution error:', execError);
-      throw new Error(`FFmpeg failed: ${execError.message}`);
-    }
+// Copy the request body to a temp file (for input ffmpeg cannot read from a pipe)
+function spoolUpload(req) {
+  const tempDir = os.tmpdir();
+  const inputPath = path.join(tempDir, `input_${Date.now()}_${Math.random().toString(36).slice(2)}`);
+  return new Promise((resolve, reject) => {
+    const file = fs.createWriteStream(inputPath);
+    let received = 0;
+    const fail = err => {
+      file.destroy();
+      fs.unlink(inputPath, () => {});
+      reject(err);
+    };
+    req.on('data', chunk => {
+      received += chunk.length;
+      if (received > MAX_UPLOAD_BYTES) {
+        req.unpipe(file);
+        req.resume();
+        fail(Object.assign(new Error('Upload too large'), { status: 413 }));
+      }
+    });
+    req.on('aborted', () => fail(new Error('Client aborted the upload')));
+    file.on('error', fail);
+    file.on('finish', () => resolve(inputPath));
+    req.pipe(file);
+  });
+}
 
-    // Read the converted file
-    if (!fs.existsSync(outputPath)) {
-      throw new Error('Output file was not created');
-    }
+// Run ffmpeg on the request body (stdin) or a spooled file and stream its stdout to the client
+function convertStream(req, res, inputPath) {
+  return new Promise(resolve => {
+    // -xerror: a demuxing error fails the job instead of ending the output early
+    const args = ['-hide_banner', '-loglevel', 'error', '-xerror', '-i', inputPath || 'pipe:0',
+                  '-vn', '-acodec', 'libmp3lame', '-b:a', MP3_BITRATE, '-f', 'mp3', 'pipe:1'];
+    const ffmpeg = spawn(ffmpegPath, args, { stdio: ['pipe', 'pipe', 'pipe'] });
+    let stderr = '';
+    let received = 0;
+    let sent = 0;
+    let failure = null;
+
+    const stop = (status, error) => {
+      if (!failure) failure = { status, error };
+      ffmpeg.kill('SIGKILL');
+    };
+    const timer = setTimeout(() => stop(504, `Conversion timed out after ${CONVERT_TIMEOUT_MS} ms`),
+                             CONVERT_TIMEOUT_MS);
+
+    res.on('close', () => {
+      if (!res.writableFinished) stop(499, 'Client disconnected');
+    });
 
-    const outputBuffer = fs.readFileSync(outputPath);
-    console.log(`📤 Sending MP3 file: ${outputBuffer.length} bytes`);
+    ffmpeg.stderr.on('data', data => {
+      stderr = (stderr + data).slice(-2000);
+    });
 
-    // Clean up temporary files
-    try {
-      fs.unlinkSync(inputPath);
-      fs.unlinkSync(outputPath);
-      console.log('🗑️ Cleaned up temporary files');
-    } catch (cleanupErr) {
-      console.warn('⚠️ Cleanup warning:', cleanupErr.message);
+    // EPIPE when ffmpeg exits before reading all of its input
+    ffmpeg.stdin.on('error', () => {});
+    if (inputPath) {
+      ffmpeg.stdin.end();
+    } else {
+      req.on('data', chunk => {
+        received += chunk.length;
+        if (received > MAX_UPLOAD_BYTES) stop(413, 'Upload too large');
+      });
+      req.on('aborted', () => stop(499, 'Client aborted the upload'));
+      req.pipe(ffmpeg.stdin);
     }
 
-    // Send the MP3 file
-    res.setHeader('Content-Type', 'audio/mpeg');
-    res.setHeader('Content-Length', outputBuffer.length);
-    res.setHeader('Content-Disposition', 'attachment; filename="converted.mp3"');
-    res.send(outputBuffer);
+    // Hold the first chunks back so input ffmpeg rejects early still gets a clean error status
+    let held = [];
+    let heldBytes = 0;
+    const write = chunk => {
+      sent += chunk.length;
+      // Backpressure: stop reading ffmpeg until the client catches up
+      if (!res.write(chunk)) {
+        ffmpeg.stdout.pause();
+        res.once('drain', () => ffmpeg.stdout.resume());
+      }
+    };
+    const startResponse = () => {
+      res.status(200);
+      res.setHeader('Content-Type', 'audio/mpeg');
+      res.setHeader('Content-Disposition', 'attachment; filename="converted.mp3"');
+      const chunks = held;
+      held = null;
+      chunks.forEach(write);
+    };
 
-  } catch (error) {
-    console.error('❌ Conversion error:', error);
-    res.status(500).json({ 
-      error: 'Conversion failed', 
-      details: error.message 
+    ffmpeg.stdout.on('data', chunk => {
+      if (!held) return write(chunk);
+      held.push(chunk);
+      heldBytes += chunk.length;
+      if (heldBytes >= HOLD_BYTES) startResponse();
+    });
+
+    ffmpeg.on('error', err => stop(500, `FFmpeg could not start: ${err.message}`));
+
+    ffmpeg.on('close', code => {
+      clearTimeout(timer);
+      if (!inputPath) {
+        // Drain whatever ffmpeg left unread so the connection can be reused
+        req.unpipe(ffmpeg.stdin);
+        req.resume();
+      }
+      if (!failure && code !== 0) {
+        // 422 before any output lets the client retry with ?input=file
+        failure = { status: held ? 422 : 500, error: `FFmpeg exited with code ${code}: ${stderr.trim()}` };
+      }
+      if (!failure && held && !heldBytes) {
+        failure = { status: 422, error: 'FFmpeg produced no audio' };
+      }
+      if (failure) {
+        console.error(`❌ Conversion failed (${failure.status}): ${failure.error}`);
+        sendError(res, failure.status, 'Conversion failed', failure.error);
+      } else {
+        if (held) startResponse();
+        res.end();
+        console.log(`📤 Streamed MP3: ${received || 'spooled'} bytes in, ${sent} bytes out`);
+      }
+      resolve();
+    });
+  });
+}
+
+// Convert endpoint
+// Streams the upload through ffmpeg (pipe:0 -> pipe:1); ?input=file spools the
+// upload to disk first for containers that need seeking (MP4 with the index at the end)
+app.post('/api/convert', async (req, res) => {
+  console.log('🎵 Audio conversion request received');
+
+  const declaredLength = parseInt(req.headers['content-length'], 10);
+  if (declaredLength === 0) {
+    return res.status(400).json({ error: 'No audio data received' });
+  }
+  if (declaredLength > MAX_UPLOAD_BYTES) {
+    return res.status(413).json({ error: 'Upload too large', details: `Limit is ${MAX_UPLOAD_BYTES} bytes` });
+  }
+  if (runningJobs >= MAX_CONCURRENT_JOBS && waitingJobs.length >= MAX_QUEUED_JOBS) {
+    res.setHeader('Retry-After', '5');
+    return res.status(503).json({
+      error: 'Converter busy',
+      details: `${runningJobs} jobs running, ${waitingJobs.length} queued`
     });
   }
+
+  // The upload is not read while queued, so TCP backpressure holds it at the client
+  const slot = acquireSlot();
+  let disconnected = false;
+  const onClose = () => {
+    disconnected = true;
+    slot.cancel();
+  };
+  res.once('close', onClose);
+  await slot.ready;
+  res.removeListener('close', onClose);
+  if (disconnected) {
+    releaseSlot();
+    return;
+  }
+
+  let inputPath = null;
+  try {
+    if (req.query.input === 'file') {
+      inputPath = await spoolUpload(req);
+    }
+    await convertStream(req, res, inputPath);
+  } catch (error) {
+    console.error('❌ Conversion error:', error.message);
+    sendError(res, error.status || 500, 'Conversion failed', error.message);
+  } finally {
+    releaseSlot();
+    if (inputPath) fs.unlink(inputPath, () => {});
+  }
 });
 
 // Root endpoint
@@ -117,10 +281,15 @@ app.get('/', (req, res) => {
 });
 
 // Start server
-app.listen(port, () => {
+const server = app.listen(port, () => {
   console.log('🚀 Audio Converter API started!');
   console.log(`📍 Server running at: http://localhost:${port}`);
   console.log(`🧪 Health check: http://localhost:${port}/api/health`);
   console.log(`🎛️ FFmpeg path: ${ffmpegPath}`);
+  console.log(`⚙️ Up to ${MAX_CONCURRENT_JOBS} conversions at once, ${MAX_QUEUED_JOBS} queued`);
   console.log('🛑 Press Ctrl+C to stop');
-});
\ No newline at end of file
+});
+
+// Keep idle connections open long enough for clients to reuse them between tracks
+server.keepAliveTimeout = envInt('KEEP_ALIVE_TIMEOUT_MS', 60000);
+server.headersTimeout = server.keepAliveTimeout + 5000;
\ No newline at end of file
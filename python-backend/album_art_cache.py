@@ -0,0 +1,186 @@
+#!/usr/bin/env python3
+"""
+Album Art Cache - shared cover art for all tracks of an album
+Covers are fetched once through a pooled HTTP session, kept in a small
+in-memory LRU and in a size-bounded on-disk store, and handed to the
+tagger as bytes (no temp file round trip).
+"""
+
+import hashlib
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+
+DEFAULT_MEMORY_ITEMS = 64
+DEFAULT_DISK_BYTES = 200 * 1024 * 1024
+
+USER_AGENT = 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'
+
+
+def image_mime_type(data):
+    """MIME type from the image's magic bytes (Spotify serves JPEG)"""
+    if data[:8] == b'\x89PNG\r\n\x1a\n':
+        return 'image/png'
+    if data[:4] == b'RIFF' and data[8:12] == b'WEBP':
+        return 'image/webp'
+    return 'image/jpeg'
+
+
+class AlbumArtCache:
+    """Two-level (memory LRU + disk) cache of album cover images"""
+
+    def __init__(self, cache_dir, session=None, pool_size=8,
+                 max_memory_items=DEFAULT_MEMORY_ITEMS, max_disk_bytes=DEFAULT_DISK_BYTES,
+                 timeout=10, limiter=None):
+        self.cache_dir = cache_dir
+        self.limiter = limiter
+        self.pool_size = pool_size
+        self.max_memory_items = max_memory_items
+        self.max_disk_bytes = max_disk_bytes
+        self.timeout = timeout
+        self.hits = 0
+        self.misses = 0
+        self._session = session
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self._inflight = {}
+        self._disk_bytes = None
+
+    @property
+    def session(self):
+        """Keep-alive session shared by all workers, created on first fetch"""
+        with self._lock:
+            if self._session is None:
+                import requests
+                session = requests.Session()
+                adapter = requests.adapters.HTTPAdapter(
+                    pool_connections=2, pool_maxsize=self.pool_size
+                )
+                session.mount('https://', adapter)
+                session.mount('http://', adapter)
+                session.headers['User-Agent'] = USER_AGENT
+                self._session = session
+            return self._session
+
+    def _path(self, key):
+        digest = hashlib.sha1(key.encode('utf-8')).hexdigest()
+        return os.path.join(self.cache_dir, digest[:2], digest + '.img')
+
+    def get(self, url, key=None):
+        """Return image bytes for `url` (cached under `key`, e.g. the album ID).
+
+        Concurrent requests for the same key share a single fetch.
+        """
+        if not url:
+            return None
+        key = key or url
+
+        while True:
+            with self._lock:
+                data = self._memory.get(key)
+                if data is not None:
+                    self._memory.move_to_end(key)
+                    self.hits += 1
+                    return data
+                event = self._inflight.get(key)
+                if event is None:
+                    event = self._inflight[key] = threading.Event()
+                    break
+            # Another worker is fetching this cover; wait and re-check
+            event.wait()
+
+        try:
+            data = self._read_disk(key)
+            if data is not None:
+                with self._lock:
+                    self.hits += 1
+            else:
+                with self._lock:
+                    self.misses += 1
+                data = self._fetch(url)
+                self._write_disk(key, data)
+            self._remember(key, data)
+            return data
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+            event.set()
+
+    def _fetch(self, url):
+        def fetch():
+            response = self.session.get(url, timeout=self.timeout)
+            response.raise_for_status()
+            return response.content
+        return self.limiter.call(fetch) if self.limiter else fetch()
+
+    def _remember(self, key, data):
+        with self._lock:
+            self._memory[key] = data
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.max_memory_items:
+                self._memory.popitem(last=False)
+
+    def _read_disk(self, key):
+        path = self._path(key)
+        try:
+            with open(path, 'rb') as f:
+                data = f.read()
+        except OSError:
+            return None
+        try:
+            os.utime(path)  # mtime doubles as the disk LRU clock
+        except OSError:
+            pass
+        return data
+
+    def _write_disk(self, key, data):
+        if self.max_disk_bytes <= 0:
+            return
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+        os.replace(temp_path, path)
+
+        with self._lock:
+            if self._disk_bytes is None:
+                self._disk_bytes = sum(size for _, size, _ in self._disk_entries())
+            else:
+                self._disk_bytes += len(data)
+            if self._disk_bytes > self.max_disk_bytes:
+                self._evict_disk()
+
+    def _disk_entries(self):
+        entries = []
+        for root, _, files in os.walk(self.cache_dir):
+            for name in files:
+                if not name.endswith('.img'):
+                    continue
+                path = os.path.join(root, name)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, path))
+        return entries
+
+    def _evict_disk(self):
+        # Called with the lock held; trims to 90% of the bound, oldest first
+        entries = sorted(self._disk_entries())
+        total = sum(size for _, size, _ in entries)
+        target = int(self.max_disk_bytes * 0.9)
+        for _, size, path in entries:
+            if total <= target:
+                break
+            try:
+                os.remove(path)
+                total -= size
+            except OSError:
+                pass
+        self._disk_bytes = total
+
+    def stats(self):
+        with self._lock:
+            return {'hits': self.hits, 'misses': self.misses, 'memory_items': len(self._memory)}
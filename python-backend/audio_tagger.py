@@ -0,0 +1,160 @@
+#!/usr/bin/env python3
+"""
+Audio Tagger - format-aware tags and cover art in one load/save per file
+Picks a backend by container (ID3 for MP3, MP4 atoms for M4A, Vorbis
+comments for Opus/Ogg/FLAC), so downloads kept in their native format
+are tagged too. Backends use mutagen; MP3 falls back to eyed3 when
+mutagen is not installed. Callers tag the temp file before moving it
+into the library, so the finished file is written once.
+"""
+
+import base64
+import os
+
+from album_art_cache import image_mime_type
+
+
+class TaggingError(Exception):
+    """Tags could not be written (missing library, unreadable file, ...)"""
+
+
+class UnsupportedFormat(TaggingError):
+    """No backend can tag this container (e.g. WebM)"""
+
+
+def _library_errors():
+    """Exceptions the backends raise for unreadable or corrupt files"""
+    errors = (OSError, ValueError)
+    try:
+        from mutagen import MutagenError
+    except ImportError:
+        return errors
+    return errors + (MutagenError,)
+
+
+def tag_id3(path, fields, cover, cover_mime):
+    try:
+        from mutagen.id3 import APIC, ID3, ID3NoHeaderError, TALB, TIT2, TPE1, TSRC
+    except ImportError:
+        return _tag_id3_eyed3(path, fields, cover, cover_mime)
+    try:
+        tags = ID3(path)
+    except ID3NoHeaderError:
+        tags = ID3()
+    tags.setall('TIT2', [TIT2(encoding=3, text=fields['title'])])
+    tags.setall('TPE1', [TPE1(encoding=3, text=fields['artist'])])
+    tags.setall('TALB', [TALB(encoding=3, text=fields['album'])])
+    if fields.get('isrc'):
+        tags.setall('TSRC', [TSRC(encoding=3, text=fields['isrc'])])
+    if cover:
+        tags.setall('APIC', [APIC(encoding=3, mime=cover_mime, type=3, desc='Cover', data=cover)])
+    tags.save(path)
+    return 'id3'
+
+
+def _tag_id3_eyed3(path, fields, cover, cover_mime):
+    try:
+        import eyed3
+    except ImportError:
+        raise TaggingError("neither mutagen nor eyed3 is installed")
+    audiofile = eyed3.load(path)
+    if audiofile is None:
+        raise TaggingError("eyed3 could not read the file")
+    if audiofile.tag is None:
+        audiofile.initTag()
+    audiofile.tag.title = fields['title']
+    audiofile.tag.artist = fields['artist']
+    audiofile.tag.album = fields['album']
+    if cover:
+        audiofile.tag.images.set(eyed3.id3.frames.ImageFrame.FRONT_COVER, cover, cover_mime)
+    audiofile.tag.save()
+    return 'id3 (eyed3)'
+
+
+def tag_mp4(path, fields, cover, cover_mime):
+    try:
+        from mutagen.mp4 import MP4, MP4Cover, MP4FreeForm
+    except ImportError:
+        raise TaggingError("mutagen is not installed")
+    audio = MP4(path)
+    if audio.tags is None:
+        audio.add_tags()
+    audio.tags['\xa9nam'] = [fields['title']]
+    audio.tags['\xa9ART'] = [fields['artist']]
+    audio.tags['\xa9alb'] = [fields['album']]
+    if fields.get('isrc'):
+        audio.tags['----:com.apple.iTunes:ISRC'] = [MP4FreeForm(fields['isrc'].encode('utf-8'))]
+    if cover:
+        image_format = MP4Cover.FORMAT_PNG if cover_mime == 'image/png' else MP4Cover.FORMAT_JPEG
+        audio.tags['covr'] = [MP4Cover(cover, imageformat=image_format)]
+    audio.save()
+    return 'mp4'
+
+
+def tag_vorbis(path, fields, cover, cover_mime):
+    try:
+        import mutagen
+        from mutagen.flac import FLAC, Picture
+    except ImportError:
+        raise TaggingError("mutagen is not installed")
+    audio = mutagen.File(path)
+    if audio is None:
+        raise TaggingError("not an Ogg or FLAC file")
+    if audio.tags is None:
+        audio.add_tags()
+    audio['title'] = [fields['title']]
+    audio['artist'] = [fields['artist']]
+    audio['album'] = [fields['album']]
+    if fields.get('isrc'):
+        audio['isrc'] = [fields['isrc']]
+    if cover:
+        picture = Picture()
+        picture.type = 3  # Front cover
+        picture.mime = cover_mime
+        picture.desc = 'Cover'
+        picture.data = cover
+        if isinstance(audio, FLAC):
+            audio.clear_pictures()
+            audio.add_picture(picture)
+        else:
+            audio['metadata_block_picture'] = [base64.b64encode(picture.write()).decode('ascii')]
+    audio.save()
+    return 'vorbis'
+
+
+# Extension -> backend(path, fields, cover, cover_mime) returning its name
+BACKENDS = {
+    '.mp3': tag_id3,
+    '.m4a': tag_mp4,
+    '.mp4': tag_mp4,
+    '.aac': tag_mp4,
+    '.opus': tag_vorbis,
+    '.ogg': tag_vorbis,
+    '.flac': tag_vorbis,
+}
+
+
+def register_backend(extension, backend):
+    """Tag files ending in `extension` with `backend`"""
+    BACKENDS[extension.lower()] = backend
+
+
+def backend_for(path):
+    """The backend for `path`'s container, or None"""
+    return BACKENDS.get(os.path.splitext(path)[1].lower())
+
+
+def write_tags(path, title, artist, album, isrc=None, cover=None):
+    """Write title, artist, album, ISRC and cover art to `path` in one
+    load/save; returns the backend name. Raises UnsupportedFormat or
+    TaggingError."""
+    backend = backend_for(path)
+    if backend is None:
+        raise UnsupportedFormat(f"no tagger for {os.path.splitext(path)[1] or 'files without an extension'}")
+    fields = {'title': title or '', 'artist': artist or '', 'album': album or '', 'isrc': isrc}
+    try:
+        return backend(path, fields, cover, image_mime_type(cover) if cover else None)
+    except TaggingError:
+        raise
+    except _library_errors() as e:
+        raise TaggingError(str(e) or type(e).__name__)
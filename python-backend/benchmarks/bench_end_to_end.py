@@ -0,0 +1,208 @@
+#!/usr/bin/env python3
+"""
+End-to-end benchmark: download_all against local stand-ins
+Runs the real downloader (fetch, search, matching, download, conversion,
+tagging) against a fake Spotify library, a fake yt-dlp and a local
+/api/convert server (see standins.py). Each library size runs in its own
+process in a scratch directory and reports tracks per second, peak RSS
+and per-stage latency from the run report. No network access is needed.
+
+Usage: python benchmarks/bench_end_to_end.py [--tracks 100 1000 10000]
+       [--workers 4] [--seed 0] [--json results.json]
+"""
+
+import argparse
+import contextlib
+import json
+import logging
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+RESULT_PREFIX = 'BENCH_RESULT '
+
+
+def peak_rss_mb():
+    """Peak resident set size of this process in MB (None if unknown)"""
+    try:
+        import resource
+    except ImportError:  # Windows
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes
+    return round(peak / (1024 * 1024 if sys.platform == 'darwin' else 1024), 1)
+
+
+def unpaced_limiters():
+    """Limiters that never hold calls back, so only the code is measured"""
+    from rate_limiter import AdaptiveRateLimiter
+    names = ('spotify', 'youtube_search', 'youtube_media', 'art_cdn')
+    return {name: AdaptiveRateLimiter(name, rate=1e6, burst=1e6, max_retries=2, base_backoff=0.01)
+            for name in names}
+
+
+def use_converter_standin(base_url):
+    """Point the downloader's cloud conversion client at the local stand-in"""
+    import converter_config
+    converter_config.USE_CLOUD_SERVER = False
+    converter_config.LOCAL_SERVER = base_url
+
+
+def run_once(args):
+    """Run one benchmark in the current process and return its result"""
+    import spotify_downloader_ultimate as app
+    from standins import (ConverterStandIn, FakeSpotify, FakeYouTube, make_fake_youtubedl,
+                          synthetic_library, synthetic_playlists, youtube_catalog)
+    from ydl_pool import YoutubeDLPool
+
+    logging.getLogger('eyed3').setLevel(logging.ERROR)
+    converter = ConverterStandIn(latency=args.convert_latency, failure_rate=args.failure_rate,
+                                 seed=args.seed).start()
+    items = synthetic_library(args.tracks, seed=args.seed, art_base_url=converter.url,
+                              duplicate_rate=args.duplicate_rate)
+    youtube = FakeYouTube(youtube_catalog(items), search_latency=args.search_latency, media_latency=args.media_latency,
+                          failure_rate=args.failure_rate, media_bytes=args.media_kb * 1024,
+                          media_ext=args.media_ext, seed=args.seed)
+
+    workdir = tempfile.mkdtemp(prefix='spotify_bench_')
+    cwd = os.getcwd()
+    os.chdir(workdir)
+    try:
+        use_converter_standin(converter.url)
+        downloader = app.UltimateSpotifyDownloader(workers=args.workers)
+        playlists = synthetic_playlists(items, args.playlists, args.playlist_size or args.tracks // 2,
+                                        seed=args.seed)
+        downloader.spotify = FakeSpotify(items, latency=args.spotify_latency, seed=args.seed,
+                                         playlists=playlists)
+        if playlists:
+            downloader.sources = [('playlist', playlist_id) for playlist_id in playlists]
+        downloader.ydl_pool = YoutubeDLPool(make_fake_youtubedl(youtube))
+        if not args.paced:
+            downloader.limiters = unpaced_limiters()
+            downloader.art_cache.limiter = downloader.limiters['art_cdn']
+
+        output = sys.stderr if args.verbose else open(os.devnull, 'w')
+        start = time.perf_counter()
+        with contextlib.redirect_stdout(output):
+            downloader.download_all()
+        elapsed = time.perf_counter() - start
+        report = downloader.metrics.report()
+    finally:
+        os.chdir(cwd)
+        converter.stop()
+        if args.keep:
+            print(f"Scratch directory kept: {workdir}", file=sys.stderr)
+        else:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    tracks = report['tracks']
+    return {
+        'tracks': args.tracks,
+        'workers': args.workers,
+        'seconds': round(elapsed, 3),
+        'tracks_per_second': round(tracks['successful'] / elapsed, 3) if elapsed else 0.0,
+        'successful': tracks['successful'],
+        'failed': tracks['failed'],
+        'peak_rss_mb': peak_rss_mb(),
+        'stages': {name: {'p50': stage['p50_seconds'], 'p95': stage['p95_seconds']}
+                   for name, stage in report['stages'].items()},
+        'failure_reasons': report['failure_reasons'],
+        'spotify_calls': downloader.spotify.calls,
+        'youtube_searches': youtube.searches,
+        'youtube_downloads': youtube.downloads,
+        'conversions': converter.conversions,
+        'art_requests': converter.art_requests,
+    }
+
+
+def run_child(args, tracks):
+    """Run one library size in a fresh interpreter so peak RSS is its own"""
+    command = [sys.executable, os.path.abspath(__file__), '--child', '--tracks', str(tracks)]
+    for name in ('workers', 'seed', 'spotify_latency', 'search_latency', 'media_latency',
+                 'convert_latency', 'failure_rate', 'duplicate_rate', 'playlists', 'playlist_size',
+                 'media_kb', 'media_ext'):
+        command += [f"--{name.replace('_', '-')}", str(getattr(args, name))]
+    command += [flag for flag, enabled in (('--paced', args.paced), ('--verbose', args.verbose),
+                                           ('--keep', args.keep)) if enabled]
+    completed = subprocess.run(command, stdout=subprocess.PIPE, universal_newlines=True)
+    for line in completed.stdout.splitlines():
+        if line.startswith(RESULT_PREFIX):
+            return json.loads(line[len(RESULT_PREFIX):])
+    raise RuntimeError(f"benchmark for {tracks} tracks exited with {completed.returncode}")
+
+
+def git_revision():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=BACKEND_DIR,
+                              stdout=subprocess.PIPE, stderr=subprocess.DEVNULL,
+                              universal_newlines=True).stdout.strip() or None
+    except OSError:
+        return None
+
+
+def print_result(result):
+    rss = f"{result['peak_rss_mb']:.1f} MB" if result['peak_rss_mb'] is not None else "n/a"
+    print(f"\n{result['tracks']} tracks, {result['workers']} workers: "
+          f"{result['seconds']:.2f}s, {result['tracks_per_second']:.2f} tracks/s, peak RSS {rss}")
+    print(f"  ok {result['successful']}, failed {result['failed']} {result['failure_reasons'] or ''}")
+    for name, stage in result['stages'].items():
+        print(f"  {name:<16} p50 {stage['p50'] * 1000:8.1f} ms   p95 {stage['p95'] * 1000:8.1f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--tracks', type=int, nargs='+', default=[100],
+                        help="Library sizes to run, e.g. 100 1000 10000")
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--spotify-latency', type=float, default=0.05, help="Seconds per API call")
+    parser.add_argument('--search-latency', type=float, default=0.05, help="Seconds per YouTube search")
+    parser.add_argument('--media-latency', type=float, default=0.1, help="Seconds per media download")
+    parser.add_argument('--convert-latency', type=float, default=0.05, help="Seconds per conversion")
+    parser.add_argument('--failure-rate', type=float, default=0.0,
+                        help="Fraction of searches, downloads and conversions that fail")
+    parser.add_argument('--duplicate-rate', type=float, default=0.0,
+                        help="Fraction of tracks that re-release an earlier recording (same ISRC)")
+    parser.add_argument('--playlists', type=int, default=0,
+                        help="Sync this many overlapping playlists instead of the liked songs")
+    parser.add_argument('--playlist-size', type=int, default=0,
+                        help="Tracks per playlist (default: half the library)")
+    parser.add_argument('--media-kb', type=int, default=32, help="Size of each fake media file")
+    parser.add_argument('--media-ext', default='m4a', choices=['m4a', 'mp3'],
+                        help="Container served by the fake yt-dlp (m4a goes through conversion)")
+    parser.add_argument('--paced', action='store_true',
+                        help="Keep the default rate limiters instead of disabling pacing")
+    parser.add_argument('--json', help="Also write the results to this file")
+    parser.add_argument('--verbose', action='store_true', help="Show the downloader's output")
+    parser.add_argument('--keep', action='store_true', help="Keep the scratch directories")
+    parser.add_argument('--child', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        args.tracks = args.tracks[0]
+        print(RESULT_PREFIX + json.dumps(run_once(args)))
+        return
+
+    revision = git_revision()
+    print(f"End-to-end benchmark at {revision or 'unknown revision'}, seed {args.seed}")
+    results = []
+    for tracks in args.tracks:
+        result = run_child(args, tracks)
+        print_result(result)
+        results.append(result)
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({'revision': revision, 'options': vars(args), 'results': results}, f, indent=2)
+        print(f"\nResults saved to: {args.json}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+"""
+Startup benchmark: time to launch the downloader for quick commands
+Each sample runs in a fresh interpreter, because that per-launch cost is
+what users pay (and what dominates on Android/Chaquopy). Reports the median
+and best wall time per scenario, both for the whole process and for the
+code after interpreter start, plus the heavy dependencies each one loaded.
+
+Usage: python benchmarks/bench_startup.py [--repeat 10] [--library DIR]
+       [--json results.json]
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+RESULT_PREFIX = 'BENCH_RESULT '
+
+# Modules that should only load once a stage needs them
+HEAVY_MODULES = ('spotipy', 'yt_dlp', 'requests', 'mutagen', 'eyed3', 'cloud_audio_converter')
+
+SCENARIOS = {
+    'import': "import spotify_downloader_ultimate",
+    'help': "import spotify_downloader_ultimate as app\napp.main(['--help'])",
+    'construct': "import spotify_downloader_ultimate as app\napp.UltimateSpotifyDownloader()",
+    'status': "import spotify_downloader_ultimate as app\napp.main(['status'])",
+    'verify': "import spotify_downloader_ultimate as app\napp.main(['verify'])",
+    # The deferred cost, paid by the first search or download of a sync
+    'first_youtube_dl': "import spotify_downloader_ultimate as app\napp.youtube_dl({'quiet': True})",
+}
+
+CHILD = """
+import contextlib, io, json, sys, time
+start = time.perf_counter()
+with contextlib.redirect_stdout(io.StringIO()):
+    try:
+        exec(compile({code!r}, {name!r}, 'exec'))
+    except SystemExit:
+        pass
+    except ImportError as e:
+        sys.stderr.write(f"{{e}}\\n")
+elapsed = time.perf_counter() - start
+print({prefix!r} + json.dumps({{'seconds': elapsed,
+                               'loaded': [m for m in {heavy!r} if m in sys.modules]}}))
+"""
+
+
+def run_sample(name, code, cwd):
+    """Run one scenario in a new interpreter; returns (process seconds, result)"""
+    env = dict(os.environ)
+    env['PYTHONPATH'] = os.pathsep.join(filter(None, [BACKEND_DIR, env.get('PYTHONPATH')]))
+    child = CHILD.format(code=code, name=name, prefix=RESULT_PREFIX, heavy=HEAVY_MODULES)
+    start = time.perf_counter()
+    completed = subprocess.run([sys.executable, '-c', child], cwd=cwd, env=env,
+                               stdout=subprocess.PIPE, universal_newlines=True)
+    elapsed = time.perf_counter() - start
+    for line in completed.stdout.splitlines():
+        if line.startswith(RESULT_PREFIX):
+            return elapsed, json.loads(line[len(RESULT_PREFIX):])
+    raise RuntimeError(f"scenario {name} exited with {completed.returncode}")
+
+
+def run_scenario(name, code, repeat, cwd):
+    process, inner, loaded = [], [], []
+    for _ in range(repeat):
+        elapsed, result = run_sample(name, code, cwd)
+        process.append(elapsed)
+        inner.append(result['seconds'])
+        loaded = result['loaded']
+    return {
+        'scenario': name,
+        'samples': repeat,
+        'process_median': round(statistics.median(process), 4),
+        'process_best': round(min(process), 4),
+        'code_median': round(statistics.median(inner), 4),
+        'code_best': round(min(inner), 4),
+        'heavy_modules_loaded': loaded,
+    }
+
+
+def baseline():
+    """Bare interpreter start, to subtract from the process times"""
+    start = time.perf_counter()
+    subprocess.run([sys.executable, '-c', 'pass'])
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--repeat', type=int, default=10, help="Fresh interpreters per scenario")
+    parser.add_argument('--scenario', action='append', choices=sorted(SCENARIOS),
+                        help="Run only these scenarios (repeatable)")
+    parser.add_argument('--library',
+                        help="Run in this directory (one with a downloaded_music folder) instead of "
+                             "an empty scratch directory")
+    parser.add_argument('--json', help="Also write the results to this file")
+    args = parser.parse_args()
+
+    names = args.scenario or list(SCENARIOS)
+    with tempfile.TemporaryDirectory(prefix='spotify_startup_') as scratch:
+        cwd = os.path.abspath(args.library) if args.library else scratch
+        interpreter = statistics.median(baseline() for _ in range(max(3, args.repeat // 2)))
+        print(f"Startup benchmark, {args.repeat} samples per scenario "
+              f"(bare interpreter: {interpreter * 1000:.0f} ms)")
+        results = []
+        for name in names:
+            result = run_scenario(name, SCENARIOS[name], args.repeat, cwd)
+            results.append(result)
+            print(f"  {name:<18} process {result['process_median'] * 1000:7.1f} ms "
+                  f"(best {result['process_best'] * 1000:6.1f})   "
+                  f"code {result['code_median'] * 1000:7.1f} ms   "
+                  f"loaded: {', '.join(result['heavy_modules_loaded']) or '-'}")
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({'interpreter_seconds': round(interpreter, 4), 'results': results}, f, indent=2)
+        print(f"\nResults saved to: {args.json}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,194 @@
+#!/usr/bin/env python3
+"""
+Sharded sync benchmark: one coordinator, N worker processes, one queue
+The coordinator queues a synthetic library (see standins.py) in a scratch
+directory and `work` processes lease, download and commit its tracks. For
+each worker count it reports tracks per second and checks that every
+track was committed once and downloaded by one worker only. --kill-one
+SIGKILLs a worker mid-run to show its expired leases being reclaimed.
+
+Usage: python benchmarks/bench_work_queue.py [--processes 1 2 4]
+       [--tracks 200] [--kill-one] [--json results.json]
+"""
+
+import argparse
+import contextlib
+import json
+import logging
+import os
+import shutil
+import signal
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from bench_end_to_end import RESULT_PREFIX, git_revision, unpaced_limiters, use_converter_standin
+
+
+def make_library(args, art_base_url):
+    from standins import synthetic_library
+    return synthetic_library(args.tracks, seed=args.seed, art_base_url=art_base_url,
+                             duplicate_rate=args.duplicate_rate)
+
+
+def run_worker_child(args):
+    """One `work` process against the fakes; prints its successful tracks"""
+    import spotify_downloader_ultimate as app
+    from standins import FakeYouTube, make_fake_youtubedl, youtube_catalog
+    from ydl_pool import YoutubeDLPool
+
+    logging.getLogger('eyed3').setLevel(logging.ERROR)
+    os.chdir(args.workdir)
+    youtube = FakeYouTube(youtube_catalog(make_library(args, args.converter_url)),
+                          search_latency=args.search_latency, media_latency=args.media_latency,
+                          failure_rate=args.failure_rate, media_bytes=32 * 1024, seed=args.seed)
+    use_converter_standin(args.converter_url)
+    downloader = app.UltimateSpotifyDownloader(workers=args.workers)
+    downloader.ydl_pool = YoutubeDLPool(make_fake_youtubedl(youtube))
+    downloader.limiters = unpaced_limiters()
+    with contextlib.redirect_stdout(sys.stderr if args.verbose else open(os.devnull, 'w')):
+        downloader.run_worker(worker_id=args.worker_id, lease_seconds=args.lease, poll=0.2)
+    report = downloader.metrics.report()
+    print(RESULT_PREFIX + json.dumps({
+        'worker': args.worker_id,
+        'downloads': youtube.downloads,
+        'successful': [track['spotify_id'] for track in report['track_timings'] if track['ok']],
+    }))
+
+
+def run_shards(args, processes):
+    """Coordinate in this process, then run `processes` workers to completion"""
+    import spotify_downloader_ultimate as app
+    from standins import ConverterStandIn, FakeSpotify
+
+    converter = ConverterStandIn(latency=args.convert_latency, seed=args.seed).start()
+    workdir = tempfile.mkdtemp(prefix='spotify_shards_')
+    cwd = os.getcwd()
+    os.chdir(workdir)
+    try:
+        coordinator = app.UltimateSpotifyDownloader()
+        coordinator.spotify = FakeSpotify(make_library(args, converter.url), seed=args.seed)
+        with contextlib.redirect_stdout(open(os.devnull, 'w')):
+            coordinator.coordinate()
+        queue_path = coordinator.work_queue_path()
+
+        start = time.perf_counter()
+        children = []
+        for n in range(processes):
+            command = [sys.executable, os.path.abspath(__file__), '--child', '--workdir', workdir,
+                       '--converter-url', converter.url, '--worker-id', f"bench-{n}"]
+            for name in ('tracks', 'seed', 'workers', 'lease', 'search_latency', 'media_latency',
+                         'failure_rate', 'duplicate_rate'):
+                command += [f"--{name.replace('_', '-')}", str(getattr(args, name))]
+            if args.verbose:
+                command.append('--verbose')
+            children.append(subprocess.Popen(command, stdout=subprocess.PIPE, universal_newlines=True))
+
+        killed = None
+        if args.kill_one and processes > 1:
+            time.sleep(args.kill_after)
+            killed = children[0]
+            killed.send_signal(signal.SIGKILL)
+
+        results = []
+        for child in children:
+            output, _ = child.communicate()
+            for line in output.splitlines():
+                if line.startswith(RESULT_PREFIX):
+                    results.append(json.loads(line[len(RESULT_PREFIX):]))
+        elapsed = time.perf_counter() - start
+
+        with contextlib.closing(sqlite3.connect(queue_path)) as conn:
+            states = dict(conn.execute("SELECT state, COUNT(*) FROM work_items GROUP BY state").fetchall())
+            reclaimed = conn.execute("SELECT COUNT(*) FROM work_items WHERE claims > 1").fetchone()[0]
+        manifest_tracks = coordinator.manifest.count()
+    finally:
+        os.chdir(cwd)
+        converter.stop()
+        if args.keep:
+            print(f"Scratch directory kept: {workdir}", file=sys.stderr)
+        else:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    successful = [spotify_id for result in results for spotify_id in result['successful']]
+    done = states.get('done', 0)
+    return {
+        'processes': processes,
+        'workers_per_process': args.workers,
+        'tracks': args.tracks,
+        'seconds': round(elapsed, 3),
+        'tracks_per_second': round(done / elapsed, 3) if elapsed else 0.0,
+        'done': done,
+        'failed': states.get('failed', 0),
+        'unfinished': states.get('pending', 0) + states.get('leased', 0),
+        'in_library': manifest_tracks,
+        'downloaded_twice': len(successful) - len(set(successful)),
+        'reclaimed': reclaimed,
+        'killed_worker': bool(killed),
+        'youtube_downloads': sum(result['downloads'] for result in results),
+    }
+
+
+def print_result(result, base_rate):
+    scaling = f", {result['tracks_per_second'] / base_rate:.2f}x" if base_rate else ""
+    print(f"\n{result['processes']} processes: {result['seconds']:.2f}s, "
+          f"{result['tracks_per_second']:.2f} tracks/s{scaling}")
+    print(f"  done {result['done']}, failed {result['failed']}, unfinished {result['unfinished']}, "
+          f"in library {result['in_library']}, downloaded twice {result['downloaded_twice']}")
+    if result['killed_worker']:
+        print(f"  killed one worker; {result['reclaimed']} tracks were leased more than once")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--processes', type=int, nargs='+', default=[1, 2, 4],
+                        help="Worker process counts to run")
+    parser.add_argument('--tracks', type=int, default=200)
+    parser.add_argument('--workers', type=int, default=2, help="Pipeline workers per process")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--lease', type=float, default=5.0, help="Lease length in seconds")
+    parser.add_argument('--search-latency', type=float, default=0.05)
+    parser.add_argument('--media-latency', type=float, default=0.2)
+    parser.add_argument('--convert-latency', type=float, default=0.05)
+    parser.add_argument('--failure-rate', type=float, default=0.0)
+    parser.add_argument('--duplicate-rate', type=float, default=0.0)
+    parser.add_argument('--kill-one', action='store_true',
+                        help="SIGKILL one worker mid-run (needs 2+ processes)")
+    parser.add_argument('--kill-after', type=float, default=1.0, help="Seconds before the kill")
+    parser.add_argument('--json', help="Also write the results to this file")
+    parser.add_argument('--verbose', action='store_true', help="Show the workers' output")
+    parser.add_argument('--keep', action='store_true', help="Keep the scratch directories")
+    parser.add_argument('--child', action='store_true', help=argparse.SUPPRESS)
+    parser.add_argument('--workdir', help=argparse.SUPPRESS)
+    parser.add_argument('--converter-url', help=argparse.SUPPRESS)
+    parser.add_argument('--worker-id', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        run_worker_child(args)
+        return
+
+    revision = git_revision()
+    print(f"Sharded sync benchmark at {revision or 'unknown revision'}, {args.tracks} tracks, seed {args.seed}")
+    results = []
+    base_rate = None
+    for processes in args.processes:
+        result = run_shards(args, processes)
+        base_rate = base_rate or result['tracks_per_second'] / result['processes']
+        print_result(result, base_rate)
+        results.append(result)
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({'revision': revision, 'options': vars(args), 'results': results}, f, indent=2)
+        print(f"\nResults saved to: {args.json}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,67 @@
+#!/usr/bin/env python3
+"""
+Micro-benchmark: per-track YoutubeDL setup cost, fresh vs pooled
+Compares building new search + download instances for every track (the
+old behaviour) with reusing the per-worker instances from YoutubeDLPool.
+No network access is needed: only instance setup and teardown are timed.
+
+Usage: python benchmarks/bench_ydl_pool.py [--tracks 200]
+"""
+
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import yt_dlp
+from yt_dlp.version import __version__ as ytdlp_version
+from spotify_downloader_ultimate import UltimateSpotifyDownloader
+from ydl_pool import YoutubeDLPool, set_output_template
+
+
+def fresh_per_track(downloader, tracks):
+    start = time.perf_counter()
+    for i in range(tracks):
+        with yt_dlp.YoutubeDL(downloader.search_ydl_options()):
+            pass
+        options = downloader.download_ydl_options('bestaudio[ext=m4a]/bestaudio/best')
+        options['outtmpl'] = f"temp_{i}.%(ext)s"
+        with yt_dlp.YoutubeDL(options):
+            pass
+    return time.perf_counter() - start
+
+
+def pooled_per_track(downloader, tracks):
+    pool = YoutubeDLPool(yt_dlp.YoutubeDL)
+    start = time.perf_counter()
+    for i in range(tracks):
+        with pool.acquire('search', downloader.search_ydl_options):
+            pass
+        with pool.acquire('download', lambda: downloader.download_ydl_options(
+                'bestaudio[ext=m4a]/bestaudio/best')) as ydl:
+            set_output_template(ydl, f"temp_{i}.%(ext)s")
+    elapsed = time.perf_counter() - start
+    pool.close_all()
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--tracks', type=int, default=200)
+    args = parser.parse_args()
+
+    downloader = UltimateSpotifyDownloader()
+    print(f"yt-dlp {ytdlp_version}, {args.tracks} tracks")
+
+    fresh = fresh_per_track(downloader, args.tracks)
+    pooled = pooled_per_track(downloader, args.tracks)
+
+    print(f"fresh instances : {fresh * 1000 / args.tracks:8.2f} ms/track")
+    print(f"pooled instances: {pooled * 1000 / args.tracks:8.2f} ms/track")
+    print(f"saved           : {(fresh - pooled) * 1000 / args.tracks:8.2f} ms/track")
+
+
+if __name__ == "__main__":
+    main()
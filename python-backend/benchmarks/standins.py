@@ -0,0 +1,366 @@
+#!/usr/bin/env python3
+"""
+Offline stand-ins for the services the downloader talks to
+- FakeSpotify: a spotipy client serving a synthetic library as liked
+  songs, playlists, albums and artists
+- make_fake_youtubedl(): a yt_dlp.YoutubeDL replacement for searches and
+  media downloads, with configurable latency and failure rate
+- ConverterStandIn: a local HTTP server with the cloud-server endpoints
+  (/api/health, /api/convert) that also serves album art under /art/
+
+Latency and failures are drawn from RNGs seeded per request, so a run
+with the same seed makes the same decisions whatever the thread timing.
+"""
+
+import json
+import random
+import threading
+import time
+import zlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# 128 kbps / 44.1 kHz MPEG-1 Layer III frame: 4-byte header + silence
+MP3_FRAME = b'\xff\xfb\x90\x00' + b'\x00' * 413
+JPEG_COVER = b'\xff\xd8\xff\xe0\x00\x10JFIF\x00\x01\x01\x00\x00\x01\x00\x01\x00\x00' + b'\x00' * 4000 + b'\xff\xd9'
+
+
+def seeded_rng(seed, *parts):
+    return random.Random(':'.join(str(part) for part in (seed,) + parts))
+
+
+def jittered(rng, latency, jitter=0.25):
+    """Latency +/- `jitter` (a fraction), drawn from `rng`"""
+    if latency <= 0:
+        return 0.0
+    return latency * rng.uniform(1 - jitter, 1 + jitter)
+
+
+def mp3_bytes(size):
+    """Silent MP3 of roughly `size` bytes that taggers can parse"""
+    return MP3_FRAME * max(1, size // len(MP3_FRAME))
+
+
+def synthetic_library(tracks, seed=0, art_base_url=None, tracks_per_album=10, duplicate_rate=0.0):
+    """Saved-track API items, newest first, for a library of `tracks` songs.
+
+    A `duplicate_rate` fraction of tracks re-release an earlier recording
+    (same name, artist, duration and ISRC under a new track ID), like a
+    single that also appears on an album or compilation.
+    """
+    rng = seeded_rng(seed, 'library')
+    items = []
+    for i in range(tracks):
+        album = i // tracks_per_album
+        number = tracks - 1 - i
+        original = items[rng.randrange(i)]['track'] if i and rng.random() < duplicate_rate else None
+        items.append({
+            # One like per minute from 2020-01-01, newest first
+            'added_at': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime(1577836800 + number * 60)),
+            'track': {
+                'id': f"track{number:07d}",
+                'name': original['name'] if original else
+                f"Song {number} {rng.choice(['Blue', 'Night', 'Gold', 'Rain', 'Fire'])}",
+                'artists': original['artists'] if original else
+                [{'id': f"artist{album % 997:03d}", 'name': f"Artist {album % 997}"}],
+                'album': {
+                    'id': f"album{album:06d}",
+                    'name': f"Album {album}",
+                    'images': [{'url': f"{art_base_url}/art/album{album:06d}.jpg"}] if art_base_url else [],
+                },
+                'duration_ms': original['duration_ms'] if original else rng.randint(120, 360) * 1000,
+                'external_ids': original['external_ids'] if original else {'isrc': f"QZBENCH{number:07d}"},
+            },
+        })
+    return items
+
+
+def youtube_catalog(items):
+    """FakeYouTube catalog for `items`: each track is found by its
+    "artist - name" query and by its quoted ISRC"""
+    catalog = {}
+    for item in items:
+        track = item['track']
+        artist = ', '.join(a['name'] for a in track['artists'])
+        entry = (artist, track['name'], track['duration_ms'] // 1000)
+        catalog[f"{artist} - {track['name']}"] = entry
+        catalog[f'"{track["external_ids"]["isrc"]}"'] = entry
+    return catalog
+
+
+def synthetic_playlists(items, count, size, seed=0):
+    """`count` playlists of `size` random (overlapping) tracks from `items`"""
+    rng = seeded_rng(seed, 'playlists')
+    ids = [item['track']['id'] for item in items]
+    return {f"playlist{n:04d}": rng.sample(ids, min(size, len(ids))) for n in range(count)}
+
+
+class FakeSpotify:
+    """Stand-in for spotipy.Spotify serving a fixed library"""
+
+    def __init__(self, items, latency=0.0, seed=0, playlists=None):
+        self.items = items
+        self.latency = latency
+        self.seed = seed
+        self.playlists = playlists or {}
+        self.calls = 0
+        self._lock = threading.Lock()
+        self._tracks = {item['track']['id']: item['track'] for item in items}
+        self._albums = {}
+        self._artist_albums = {}
+        for item in reversed(items):  # Oldest first, like a discography
+            track = item['track']
+            album = track['album']
+            self._albums.setdefault(album['id'], []).append(track)
+            for artist in track['artists']:
+                albums = self._artist_albums.setdefault(artist.get('id'), [])
+                if album['id'] not in albums:
+                    albums.append(album['id'])
+
+    @staticmethod
+    def _page(items, limit, offset):
+        page = items[offset:offset + limit]
+        return {'items': page, 'total': len(items), 'limit': limit, 'offset': offset,
+                'next': 'next' if offset + limit < len(items) else None}
+
+    def _wait(self, *key):
+        with self._lock:
+            self.calls += 1
+        time.sleep(jittered(seeded_rng(self.seed, 'spotify', *key), self.latency))
+
+    def current_user(self):
+        self._wait('me')
+        return {'display_name': 'benchmark', 'id': 'benchmark'}
+
+    def current_user_saved_tracks(self, limit=20, offset=0, market=None):
+        self._wait('saved', offset)
+        return self._page(self.items, limit, offset)
+
+    def tracks(self, tracks, market=None):
+        self._wait('tracks', tracks[0] if tracks else None)
+        return {'tracks': [self._tracks.get(track_id) for track_id in tracks[:50]]}
+
+    def playlist_items(self, playlist_id, fields=None, limit=100, offset=0, market=None,
+                       additional_types=('track', 'episode')):
+        self._wait('playlist', playlist_id, offset)
+        entries = [{'track': {'id': track_id, 'type': 'track', 'is_local': False}}
+                   for track_id in self.playlists.get(playlist_id, [])]
+        return self._page(entries, min(limit, 100), offset)
+
+    def _album_tracks(self, album_id):
+        # Album endpoints return simplified tracks (no album, no ISRC)
+        return [{key: value for key, value in track.items() if key not in ('album', 'external_ids')}
+                for track in self._albums.get(album_id, [])]
+
+    def _album(self, album_id):
+        if album_id not in self._albums:
+            return None
+        album = dict(self._albums[album_id][0]['album'])
+        album['tracks'] = self._page(self._album_tracks(album_id), 50, 0)
+        return album
+
+    def albums(self, albums, market=None):
+        self._wait('albums', albums[0] if albums else None)
+        return {'albums': [self._album(album_id) for album_id in albums[:20]]}
+
+    def album_tracks(self, album_id, limit=50, offset=0, market=None):
+        self._wait('album_tracks', album_id, offset)
+        return self._page(self._album_tracks(album_id), limit, offset)
+
+    def artist_albums(self, artist_id, album_type=None, include_groups=None, country=None,
+                      limit=20, offset=0):
+        self._wait('artist_albums', artist_id, offset)
+        albums = [{'id': album_id} for album_id in self._artist_albums.get(artist_id, [])]
+        return self._page(albums, limit, offset)
+
+
+class FakeDownloadError(Exception):
+    """Shaped like yt_dlp.utils.DownloadError"""
+
+    def __init__(self, message):
+        super().__init__(message)
+        self.exc_info = None
+
+
+class FakeYouTube:
+    """Shared state behind the fake YoutubeDL instances.
+
+    `catalog` maps "Artist - Name" and quoted ISRC queries to
+    (artist, name, duration_s).
+    """
+
+    def __init__(self, catalog, search_latency=0.3, media_latency=0.5,
+                 failure_rate=0.0, media_bytes=64 * 1024, media_ext='m4a', seed=0):
+        self.catalog = catalog
+        self.search_latency = search_latency
+        self.media_latency = media_latency
+        self.failure_rate = failure_rate
+        self.media_bytes = media_bytes
+        self.media_ext = media_ext
+        self.seed = seed
+        self.searches = 0
+        self.downloads = 0
+        self.instances = 0
+        self._attempts = {}
+        self._lock = threading.Lock()
+
+    def _rng(self, kind, key):
+        with self._lock:
+            attempt = self._attempts.get((kind, key), 0)
+            self._attempts[(kind, key)] = attempt + 1
+        return seeded_rng(self.seed, kind, key, attempt)
+
+    def search(self, url):
+        prefix, _, query = url.partition(':')
+        count = int(prefix[len('ytsearch'):] or 1) if prefix.startswith('ytsearch') else 1
+        rng = self._rng('search', query)
+        with self._lock:
+            self.searches += 1
+        time.sleep(jittered(rng, self.search_latency))
+        if rng.random() < self.failure_rate:
+            raise FakeDownloadError("ERROR: Unable to download API page: HTTP Error 503: Service Unavailable")
+
+        artist, name, duration = self.catalog.get(query, (query, query, 200))
+        variants = [
+            (f"{artist} - {name} (Official Audio)", f"{artist} - Topic", duration),
+            (f"{artist} - {name} (Live)", f"{artist} fans", duration + 45),
+            (f"{name} (Cover)", "Cover Channel", duration + 3),
+            (f"{artist} - {name} (Sped Up)", "Edits", int(duration * 0.8)),
+            (f"{artist} - {name} (Lyrics)", "Lyric Videos", duration + 1),
+        ]
+        entries = []
+        for i, (title, channel, seconds) in enumerate(variants[:count]):
+            video_id = f"{zlib.crc32(query.encode('utf-8')):010d}{i}"
+            entries.append({
+                'id': video_id, 'title': title, 'channel': channel, 'uploader': channel,
+                'duration': seconds, 'view_count': 1000 * (count - i),
+                'url': f"https://www.youtube.com/watch?v={video_id}",
+            })
+        return {'_type': 'playlist', 'entries': entries}
+
+    def download(self, url, outtmpl):
+        rng = self._rng('media', url)
+        with self._lock:
+            self.downloads += 1
+        time.sleep(jittered(rng, self.media_latency))
+        if rng.random() < self.failure_rate:
+            raise FakeDownloadError(f"ERROR: [youtube] {url}: Video unavailable")
+
+        path = outtmpl.replace('%(ext)s', self.media_ext)
+        with open(path, 'wb') as f:
+            if self.media_ext == 'mp3':
+                f.write(mp3_bytes(self.media_bytes))
+            else:
+                # Content derives from the URL so conversions are reproducible
+                header = b'\x00\x00\x00\x20ftypM4A ' + url.encode('utf-8')
+                f.write(header + b'\x00' * max(0, self.media_bytes - len(header)))
+        video_id = url.rsplit('=', 1)[-1]
+        return {'id': video_id, 'ext': self.media_ext, 'requested_downloads': [{'filepath': path}]}
+
+
+def make_fake_youtubedl(youtube):
+    """A YoutubeDL class bound to `youtube` (a FakeYouTube)"""
+
+    class FakeYoutubeDL:
+        def __init__(self, params=None):
+            self.params = dict(params or {})
+            with youtube._lock:
+                youtube.instances += 1
+
+        def __enter__(self):
+            return self
+
+        def __exit__(self, *exc):
+            return False
+
+        def extract_info(self, url, download=True, **kwargs):
+            if '://' not in url and not url.startswith('ytsearch'):
+                # Plain text goes through default_search, as in yt-dlp
+                url = (self.params.get('default_search') or 'ytsearch:') + url
+            if url.startswith('ytsearch'):
+                return youtube.search(url)
+            outtmpl = self.params.get('outtmpl')
+            if isinstance(outtmpl, dict):
+                outtmpl = outtmpl.get('default')
+            return youtube.download(url, outtmpl or '%(id)s.%(ext)s')
+
+        def prepare_filename(self, info):
+            return f"{info.get('id')}.{info.get('ext')}"
+
+    return FakeYoutubeDL
+
+
+class ConverterStandIn:
+    """Local stand-in for cloud-server/server.js plus an album art CDN"""
+
+    def __init__(self, latency=0.2, bytes_per_second=20 * 1024 * 1024, failure_rate=0.0, seed=0):
+        self.latency = latency
+        self.bytes_per_second = bytes_per_second
+        self.failure_rate = failure_rate
+        self.seed = seed
+        self.conversions = 0
+        self.art_requests = 0
+        self._lock = threading.Lock()
+        self._server = None
+
+    @property
+    def url(self):
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        standin = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def log_message(self, *args):
+                pass
+
+            def _send(self, status, body, content_type):
+                self.send_response(status)
+                self.send_header('Content-Type', content_type)
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def _send_json(self, status, payload):
+                self._send(status, json.dumps(payload).encode('utf-8'), 'application/json')
+
+            def do_GET(self):
+                if self.path == '/api/health':
+                    self._send_json(200, {'status': 'OK', 'ffmpeg': 'stand-in'})
+                elif self.path.startswith('/art/'):
+                    with standin._lock:
+                        standin.art_requests += 1
+                    self._send(200, JPEG_COVER, 'image/jpeg')
+                else:
+                    self._send_json(404, {'error': 'Not found'})
+
+            def do_POST(self):
+                if self.path != '/api/convert':
+                    self._send_json(404, {'error': 'Not found'})
+                    return
+                length = int(self.headers.get('Content-Length') or 0)
+                body = self.rfile.read(length)
+                if not body:
+                    self._send_json(400, {'error': 'No audio data received'})
+                    return
+                with standin._lock:
+                    standin.conversions += 1
+                rng = seeded_rng(standin.seed, 'convert', zlib.crc32(body[:4096]))
+                time.sleep(jittered(rng, standin.latency) + len(body) / standin.bytes_per_second)
+                if rng.random() < standin.failure_rate:
+                    self._send_json(500, {'error': 'Conversion failed', 'details': 'stand-in failure'})
+                    return
+                self._send(200, mp3_bytes(len(body)), 'audio/mpeg')
+
+        self._server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self._server.daemon_threads = True
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
@@ -0,0 +1,320 @@
+#!/usr/bin/env python3
+"""
+Cloud Audio Converter - streaming client for cloud-server/server.js
+Uploads downloads and writes the MP3 back in fixed-size chunks over pooled
+keep-alive connections, so neither side holds a whole file in memory.
+Over plain HTTP the upload runs on its own thread while the response is
+read, so the server can stream ffmpeg's output before the upload has
+finished. An SSL socket cannot be read and written from two threads at
+once, so over HTTPS the server spools the upload to disk and the whole
+body is sent before the response is read.
+"""
+
+import http.client
+import json
+import mimetypes
+import os
+import socket
+import threading
+import time
+import urllib.parse
+from collections import deque
+
+import converter_config
+
+CHUNK_SIZE = 64 * 1024
+CONNECT_TIMEOUT = 10
+IO_TIMEOUT = 300       # Seconds without progress before a conversion is abandoned
+POOL_SIZE = 8          # Idle keep-alive connections kept per server
+IDLE_TIMEOUT = 30      # Below server.js's keep-alive timeout, so idle sockets are still open
+HEALTH_TTL = 60        # Seconds a health check result is reused
+BUSY_RETRIES = 3       # Retries when the server's job queue is full (503)
+MAX_RETRY_AFTER = 30
+
+
+def server_url():
+    """Base URL of the configured conversion server, or '' if none"""
+    if converter_config.USE_CLOUD_SERVER:
+        url = converter_config.CLOUD_SERVER
+    else:
+        url = converter_config.LOCAL_SERVER
+    return (url or '').strip().rstrip('/')
+
+
+class _Upload(threading.Thread):
+    """Streams a file into a socket while the caller reads the response"""
+
+    def __init__(self, sock, path):
+        super().__init__(daemon=True)
+        self.sock = sock
+        self.path = path
+        self.done = False
+        self.error = None
+        self._cancelled = threading.Event()
+
+    def run(self):
+        try:
+            with open(self.path, 'rb') as f:
+                while not self._cancelled.is_set():
+                    block = f.read(CHUNK_SIZE)
+                    if not block:
+                        self.done = True
+                        return
+                    self.sock.sendall(block)
+        except OSError as e:
+            self.error = e
+
+    def cancel(self):
+        self._cancelled.set()
+
+
+class CloudConverterClient:
+    """Keep-alive connection pool and conversion requests for one server"""
+
+    def __init__(self, base_url, pool_size=POOL_SIZE, timeout=IO_TIMEOUT):
+        parts = urllib.parse.urlsplit(base_url)
+        if parts.scheme not in ('http', 'https') or not parts.hostname:
+            raise ValueError(f"Not an http(s) URL: {base_url}")
+        self.base_url = base_url
+        self.pool_size = pool_size
+        self.timeout = timeout
+        self.connections_opened = 0
+        self._connection_class = (http.client.HTTPSConnection if parts.scheme == 'https'
+                                  else http.client.HTTPConnection)
+        # Upload and read concurrently (plain sockets only, see above)
+        self.duplex = parts.scheme == 'http'
+        self._host = parts.hostname
+        self._port = parts.port
+        self._prefix = parts.path.rstrip('/')
+        self._idle = deque()  # (connection, idle since)
+        self._lock = threading.Lock()
+        self._health = None  # (checked at, healthy)
+
+    # Connection pool
+
+    def _checkout(self):
+        """An idle connection (reused=True) or a newly opened one"""
+        now = time.monotonic()
+        stale = []
+        with self._lock:
+            while self._idle:
+                conn, idle_since = self._idle.pop()
+                if now - idle_since < IDLE_TIMEOUT:
+                    break
+                stale.append(conn)
+            else:
+                conn = None
+                self.connections_opened += 1
+        for old in stale:
+            old.close()
+        if conn is not None:
+            return conn, True
+
+        conn = self._connection_class(self._host, self._port, timeout=CONNECT_TIMEOUT)
+        conn.connect()
+        conn.sock.settimeout(self.timeout)
+        return conn, False
+
+    def _checkin(self, conn):
+        with self._lock:
+            if len(self._idle) < self.pool_size:
+                self._idle.append((conn, time.monotonic()))
+                return
+        conn.close()
+
+    @staticmethod
+    def _discard(conn):
+        # shutdown() also wakes an upload thread blocked in sendall()
+        if conn.sock is not None:
+            try:
+                conn.sock.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+        conn.close()
+
+    def close(self):
+        """Close every idle connection"""
+        with self._lock:
+            idle, self._idle = list(self._idle), deque()
+        for conn, _ in idle:
+            conn.close()
+
+    # Requests
+
+    def _start(self, method, path, headers=(), body_path=None):
+        """Send a request, streaming `body_path` on a background thread when
+        the connection is duplex, and return (connection, response, upload)
+        once the status line arrives"""
+        for attempt in range(2):
+            conn, reused = self._checkout()
+            upload = None
+            try:
+                conn.putrequest(method, self._prefix + path)
+                for name, value in headers:
+                    conn.putheader(name, value)
+                if body_path is not None:
+                    conn.putheader('Content-Length', str(os.path.getsize(body_path)))
+                conn.endheaders()
+                if body_path is not None:
+                    upload = _Upload(conn.sock, body_path)
+                    if self.duplex:
+                        upload.start()
+                    else:
+                        # Send it all first; the server may still have answered early
+                        upload.run()
+                return conn, conn.getresponse(), upload
+            except (OSError, http.client.HTTPException):
+                if upload is not None:
+                    upload.cancel()
+                self._discard(conn)
+                # The server may have closed an idle connection; retry once on a new one
+                if not reused or attempt:
+                    raise
+
+    def _finish(self, conn, response, upload):
+        """Return the connection to the pool if the exchange completed cleanly"""
+        if upload is not None and not upload.done:
+            upload.cancel()
+            self._discard(conn)
+            # Uploads on a non-duplex connection never start a thread
+            if upload.is_alive():
+                upload.join(CONNECT_TIMEOUT)
+            return
+        if upload is not None and upload.is_alive():
+            upload.join()
+        if response.isclosed() and not response.will_close:
+            self._checkin(conn)
+        else:
+            self._discard(conn)
+
+    def healthy(self):
+        """Whether /api/health answers, cached for HEALTH_TTL seconds"""
+        now = time.monotonic()
+        if self._health and now - self._health[0] < HEALTH_TTL:
+            return self._health[1]
+        try:
+            conn, response, upload = self._start('GET', '/api/health')
+            response.read()
+            self._finish(conn, response, upload)
+            ok = response.status == 200
+        except (OSError, http.client.HTTPException):
+            ok = False
+        self._health = (now, ok)
+        return ok
+
+    def convert(self, input_path, output_path, seekable_input=False):
+        """POST `input_path` to /api/convert and stream the MP3 into
+        `output_path`. Returns (status, error detail, Retry-After seconds);
+        raises OSError or HTTPException if the transfer breaks off.
+
+        `seekable_input` asks the server to spool the upload to disk before
+        ffmpeg reads it, for files ffmpeg cannot decode from a pipe. Without
+        a duplex connection every upload is spooled: the server would
+        otherwise block on output nobody reads until the upload ends.
+        """
+        seekable_input = seekable_input or not self.duplex
+        content_type = mimetypes.guess_type(input_path)[0] or 'application/octet-stream'
+        path = '/api/convert' + ('?input=file' if seekable_input else '')
+        try:
+            conn, response, upload = self._start('POST', path, [('Content-Type', content_type)], input_path)
+        except (OSError, http.client.HTTPException):
+            self._health = (time.monotonic(), False)
+            raise
+
+        if response.status != 200:
+            body = response.read()  # Short JSON error
+            self._finish(conn, response, upload)
+            try:
+                payload = json.loads(body.decode('utf-8'))
+                detail = payload.get('details') or payload.get('error')
+            except (ValueError, AttributeError):
+                detail = body[:200].decode('utf-8', 'replace')
+            try:
+                retry_after = float(response.getheader('Retry-After') or 0)
+            except ValueError:
+                retry_after = 0
+            return response.status, detail, retry_after
+
+        partial = output_path + '.part'
+        try:
+            with open(partial, 'wb') as f:
+                while True:
+                    chunk = response.read(CHUNK_SIZE)
+                    if not chunk:
+                        break
+                    f.write(chunk)
+            if os.path.getsize(partial) == 0:
+                raise http.client.HTTPException("empty response")
+            os.replace(partial, output_path)
+        except BaseException:
+            self._discard(conn)
+            if upload is not None:
+                upload.cancel()
+            try:
+                os.remove(partial)
+            except OSError:
+                pass
+            raise
+        self._finish(conn, response, upload)
+        return 200, None, 0
+
+
+_clients = {}
+_clients_lock = threading.Lock()
+
+
+def get_client():
+    """The pooled client for the configured server (None if unset)"""
+    url = server_url()
+    if not url:
+        return None
+    # The Android app can switch servers at runtime, so keep one client per URL
+    with _clients_lock:
+        client = _clients.get(url)
+        if client is None:
+            client = _clients[url] = CloudConverterClient(url)
+    return client
+
+
+def is_cloud_audio_available():
+    """Whether the configured conversion server answers its health check"""
+    try:
+        client = get_client()
+    except ValueError as e:
+        print(f"⚠️ Invalid converter server URL: {e}")
+        return False
+    return bool(client and client.healthy())
+
+
+def convert_audio_to_mp3_cloud(input_path, output_path):
+    """Convert through the conversion server; returns True on success"""
+    try:
+        client = get_client()
+    except ValueError as e:
+        print(f"⚠️ Invalid converter server URL: {e}")
+        return False
+    if client is None:
+        return False
+
+    name = os.path.basename(input_path)
+    seekable_input = False
+    busy_retries = 0
+    while True:
+        try:
+            status, detail, retry_after = client.convert(input_path, output_path, seekable_input)
+        except (OSError, http.client.HTTPException) as e:
+            print(f"❌ Cloud conversion failed for {name}: {e or type(e).__name__}")
+            return False
+        if status == 200:
+            return True
+        if status == 503 and busy_retries < BUSY_RETRIES:
+            # Server queue is full; wait as long as it asks
+            busy_retries += 1
+            time.sleep(min(retry_after or 2 ** busy_retries, MAX_RETRY_AFTER))
+            continue
+        if status == 422 and not seekable_input:
+            # ffmpeg could not decode the stream (e.g. an MP4 with its index at the end)
+            seekable_input = True
+            continue
+        print(f"❌ Cloud conversion failed for {name}: HTTP {status} {detail or ''}".rstrip())
+        return False
@@ -0,0 +1,17 @@
+#!/usr/bin/env python3
+"""
+Converter Config - where the cloud audio converter sends conversions
+The Android app overwrites these attributes at runtime (Server Settings),
+so cloud_audio_converter reads them on every request rather than at import.
+"""
+
+import os
+
+# Use CLOUD_SERVER instead of LOCAL_SERVER
+USE_CLOUD_SERVER = os.environ.get('USE_CLOUD_SERVER', '').lower() in ('1', 'true', 'yes')
+
+# Deployed cloud-server/server.js (e.g. your Vercel or Render URL)
+CLOUD_SERVER = os.environ.get('CLOUD_CONVERTER_URL', '')
+
+# cloud-server/server.js running on this machine or the local network
+LOCAL_SERVER = os.environ.get('LOCAL_CONVERTER_URL', 'http://localhost:3000')
@@ -0,0 +1,141 @@
+#!/usr/bin/env python3
+"""
+Download Pipeline - bounded multi-stage worker pipeline
+Each stage runs in its own thread pool and hands work to the next stage
+through a bounded queue, so a slow stage applies back-pressure instead of
+letting tracks pile up in memory.
+"""
+
+import queue
+import threading
+
+# Marks the end of input for a single worker
+_SENTINEL = object()
+
+# How often blocked workers re-check the stop flag (seconds)
+_POLL_INTERVAL = 0.2
+
+
+class PipelineStage:
+    """A named pipeline step backed by `workers` threads.
+
+    `func(item)` returns True to pass the item on to the next stage, or
+    False when the item is finished (skipped, failed or done early).
+    """
+
+    def __init__(self, name, func, workers=1):
+        self.name = name
+        self.func = func
+        self.workers = max(1, int(workers))
+
+
+class DownloadPipeline:
+    """Run items through a chain of PipelineStage objects concurrently"""
+
+    def __init__(self, stages, queue_size=8, on_done=None, stop_event=None):
+        self.stages = list(stages)
+        self.on_done = on_done
+        self.stop_event = stop_event or threading.Event()
+        self._queues = [queue.Queue(maxsize=max(1, queue_size)) for _ in self.stages]
+        self._alive = [stage.workers for stage in self.stages]
+        self._alive_lock = threading.Lock()
+        self._threads = []
+
+    def start(self):
+        """Start every stage's worker threads"""
+        for index, stage in enumerate(self.stages):
+            for n in range(stage.workers):
+                thread = threading.Thread(
+                    target=self._worker,
+                    args=(index,),
+                    name=f"{stage.name}-{n + 1}",
+                    daemon=True,
+                )
+                thread.start()
+                self._threads.append(thread)
+
+    def submit(self, item):
+        """Queue an item for the first stage; returns False once stopped"""
+        return self._put(self._queues[0], item)
+
+    def close(self):
+        """Signal that no more items will be submitted"""
+        for _ in range(self.stages[0].workers):
+            if not self._put(self._queues[0], _SENTINEL):
+                return
+
+    def stop(self):
+        """Ask all workers to exit after their current item"""
+        self.stop_event.set()
+
+    def join(self):
+        """Wait for all workers to exit"""
+        for thread in self._threads:
+            while thread.is_alive():
+                thread.join(_POLL_INTERVAL)
+
+    def run(self, items):
+        """Feed `items` through the pipeline and wait until it drains"""
+        self.start()
+        for item in items:
+            if not self.submit(item):
+                break
+        self.close()
+        self.join()
+
+    def _put(self, q, item):
+        while not self.stop_event.is_set():
+            try:
+                q.put(item, timeout=_POLL_INTERVAL)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _finish(self, item, error=None):
+        if not self.on_done:
+            return
+        # A failing callback must not kill the worker: a stage without
+        # workers would leave the stage before it blocked on a full queue
+        try:
+            self.on_done(item, error)
+        except Exception as e:
+            print(f"⚠️  Pipeline completion callback failed in {threading.current_thread().name}: {e}")
+
+    def _worker(self, index):
+        stage = self.stages[index]
+        inbox = self._queues[index]
+        outbox = self._queues[index + 1] if index + 1 < len(self.stages) else None
+
+        try:
+            while not self.stop_event.is_set():
+                try:
+                    item = inbox.get(timeout=_POLL_INTERVAL)
+                except queue.Empty:
+                    continue
+                if item is _SENTINEL:
+                    break
+
+                try:
+                    passed = stage.func(item)
+                except Exception as e:
+                    self._finish(item, e)
+                    continue
+
+                # Finished items are always reported, even after a stop, so
+                # the caller's counters match what was actually written
+                if passed and outbox is not None:
+                    # Stopped: the item is dropped before its next stage
+                    if not self._put(outbox, item):
+                        break
+                else:
+                    self._finish(item)
+        finally:
+            with self._alive_lock:
+                self._alive[index] -= 1
+                last_worker = self._alive[index] == 0
+            # The last worker out closes the next stage
+            if last_worker and outbox is not None:
+                for _ in range(self.stages[index + 1].workers):
+                    if not self._put(outbox, _SENTINEL):
+                        break
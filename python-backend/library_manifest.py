@@ -0,0 +1,220 @@
+#!/usr/bin/env python3
+"""
+Library Manifest - persistent record of downloaded tracks
+Keyed by Spotify track ID so incremental syncs are a single indexed query
+instead of one filesystem probe per track.
+"""
+
+import os
+import sqlite3
+import threading
+import time
+
+# File extensions the downloader can leave in the library
+AUDIO_EXTENSIONS = ('.mp3', '.m4a', '.webm', '.opus', '.mp4')
+
+
+class LibraryManifest:
+    """SQLite-backed map of spotify_id -> downloaded file"""
+
+    def __init__(self, db_path, journal_mode='WAL'):
+        self.db_path = db_path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(db_path, check_same_thread=False, timeout=30)
+        self._conn.row_factory = sqlite3.Row
+        with self._lock, self._conn:
+            self._conn.execute(f"PRAGMA journal_mode={journal_mode}")
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS tracks (
+                    spotify_id TEXT PRIMARY KEY,
+                    video_id TEXT,
+                    path TEXT NOT NULL,
+                    format TEXT,
+                    size INTEGER,
+                    downloaded_at REAL NOT NULL
+                )
+            """)
+            # Columns added after the first release; ALTER existing manifests
+            columns = {row[1] for row in self._conn.execute("PRAGMA table_info(tracks)")}
+            for column in ('isrc', 'alias_of'):
+                if column not in columns:
+                    self._conn.execute(f"ALTER TABLE tracks ADD COLUMN {column} TEXT")
+            self._conn.execute("CREATE INDEX IF NOT EXISTS tracks_isrc ON tracks (isrc)")
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS sync_state (
+                    key TEXT PRIMARY KEY,
+                    value TEXT
+                )
+            """)
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    def record(self, spotify_id, path, video_id=None, fmt=None, size=None, isrc=None, alias_of=None):
+        """Insert or replace the entry for a downloaded track.
+
+        `alias_of` names the track whose download this entry reuses (same
+        ISRC); aliases share the original's file or a hardlink to it.
+        """
+        if fmt is None:
+            fmt = os.path.splitext(path)[1].lstrip('.') or None
+        if size is None:
+            try:
+                size = os.path.getsize(path)
+            except OSError:
+                size = None
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO tracks "
+                "(spotify_id, video_id, path, format, size, downloaded_at, isrc, alias_of) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (spotify_id, video_id, os.path.abspath(path), fmt, size, time.time(), isrc, alias_of),
+            )
+
+    def get(self, spotify_id):
+        """Return the manifest entry as a dict, or None"""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT * FROM tracks WHERE spotify_id = ?", (spotify_id,)
+            ).fetchone()
+        return dict(row) if row else None
+
+    def by_isrc(self, isrcs):
+        """Map each ISRC in `isrcs` that has a download to one entry for it
+        (the original rather than an alias where both exist)"""
+        isrcs = list({isrc for isrc in isrcs if isrc})
+        found = {}
+        with self._lock:
+            # Stay well below SQLite's bound-parameter limit
+            for start in range(0, len(isrcs), 500):
+                chunk = isrcs[start:start + 500]
+                rows = self._conn.execute(
+                    "SELECT * FROM tracks WHERE isrc IN (%s) "
+                    "ORDER BY alias_of IS NOT NULL DESC" % ', '.join('?' * len(chunk)),
+                    chunk,
+                ).fetchall()
+                # Originals sort last, so they overwrite any alias
+                for row in rows:
+                    found[row['isrc']] = dict(row)
+        return found
+
+    def remove(self, spotify_id):
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM tracks WHERE spotify_id = ?", (spotify_id,))
+
+    def count(self):
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM tracks").fetchone()[0]
+
+    def summary(self):
+        """Track and alias counts, size on disk and files per format"""
+        with self._lock:
+            tracks, aliases, size = self._conn.execute(
+                "SELECT COUNT(*), COUNT(alias_of), SUM(CASE WHEN alias_of IS NULL THEN size END) "
+                "FROM tracks"
+            ).fetchone()
+            rows = self._conn.execute(
+                "SELECT format, COUNT(*) FROM tracks WHERE alias_of IS NULL "
+                "GROUP BY format ORDER BY COUNT(*) DESC"
+            ).fetchall()
+        return {'tracks': tracks, 'aliases': aliases, 'bytes': size or 0,
+                'formats': {row[0] or 'unknown': row[1] for row in rows}}
+
+    def entries(self):
+        """All manifest entries as dicts"""
+        with self._lock:
+            rows = self._conn.execute("SELECT * FROM tracks ORDER BY downloaded_at").fetchall()
+        return [dict(row) for row in rows]
+
+    def get_state(self, key, default=None):
+        """Read a persisted sync value (e.g. the liked-songs cursor)"""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value FROM sync_state WHERE key = ?", (key,)
+            ).fetchone()
+        return row[0] if row else default
+
+    def set_state(self, key, value):
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO sync_state (key, value) VALUES (?, ?)", (key, value)
+            )
+
+    def missing(self, spotify_ids):
+        """Return the IDs from `spotify_ids` that are not in the manifest,
+        preserving input order"""
+        spotify_ids = [sid for sid in spotify_ids if sid]
+        if not spotify_ids:
+            return []
+        with self._lock, self._conn:
+            self._conn.execute(
+                "CREATE TEMP TABLE IF NOT EXISTS wanted (spotify_id TEXT PRIMARY KEY)"
+            )
+            self._conn.execute("DELETE FROM wanted")
+            self._conn.executemany(
+                "INSERT OR IGNORE INTO wanted (spotify_id) VALUES (?)",
+                ((sid,) for sid in spotify_ids),
+            )
+            rows = self._conn.execute(
+                "SELECT w.spotify_id FROM wanted w "
+                "LEFT JOIN tracks t ON t.spotify_id = w.spotify_id "
+                "WHERE t.spotify_id IS NULL"
+            ).fetchall()
+        absent = {row[0] for row in rows}
+        return [sid for sid in spotify_ids if sid in absent]
+
+    @staticmethod
+    def scan_directory(directory):
+        """Map file stem -> DirEntry for every audio file in `directory`"""
+        files_by_stem = {}
+        if not os.path.isdir(directory):
+            return files_by_stem
+        # One directory listing instead of a stat per track and extension
+        with os.scandir(directory) as it:
+            for entry in it:
+                stem, ext = os.path.splitext(entry.name)
+                if entry.is_file() and ext.lower() in AUDIO_EXTENSIONS:
+                    # Prefer MP3 when the same track exists in several formats
+                    if stem not in files_by_stem or ext.lower() == '.mp3':
+                        files_by_stem[stem] = entry
+        return files_by_stem
+
+    def rebuild_from_directory(self, directory, songs, filename_for, files_by_stem=None):
+        """Match existing audio files in `directory` to `songs` and record them.
+
+        `filename_for(song)` must return the file stem the downloader uses
+        for that song. Pass a `scan_directory` result as `files_by_stem` to
+        reuse one listing across several batches of songs. Returns the
+        number of newly recorded tracks.
+        """
+        if files_by_stem is None:
+            files_by_stem = self.scan_directory(directory)
+        if not files_by_stem:
+            return 0
+
+        rows = []
+        now = time.time()
+        for song in songs:
+            entry = files_by_stem.get(filename_for(song))
+            if entry is None or not song.get('spotify_id'):
+                continue
+            rows.append((
+                song['spotify_id'],
+                None,
+                os.path.abspath(entry.path),
+                os.path.splitext(entry.name)[1].lstrip('.').lower(),
+                entry.stat().st_size,
+                now,
+                song.get('isrc'),
+            ))
+
+        # Existing entries win: they may know the source video
+        with self._lock, self._conn:
+            cursor = self._conn.executemany(
+                "INSERT OR IGNORE INTO tracks "
+                "(spotify_id, video_id, path, format, size, downloaded_at, isrc) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                rows,
+            )
+        return max(cursor.rowcount, 0)
@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+"""
+Local Audio Converter - ffmpeg subprocesses bounded to the CPU count
+Converts downloads to MP3 (or remuxes them into an audio-only container
+without re-encoding) on the machine running the downloader, so nothing is
+uploaded and the conversion stage can run several jobs alongside downloads.
+"""
+
+import os
+import shutil
+import subprocess
+import threading
+
+DEFAULT_BITRATE = '192k'
+DEFAULT_TIMEOUT = 300
+
+# Remux targets: containers whose audio stream can be copied as-is
+REMUX_EXTENSIONS = {
+    '.webm': '.opus',  # Opus in WebM -> Ogg
+    '.mp4': '.m4a',    # AAC in a video container -> audio-only MP4
+}
+
+
+def find_ffmpeg():
+    """Path of the ffmpeg binary (FFMPEG_PATH overrides PATH), or None"""
+    configured = os.environ.get('FFMPEG_PATH')
+    if configured and os.path.isfile(configured):
+        return configured
+    return shutil.which('ffmpeg')
+
+
+def remux_extension(path):
+    """Audio-only extension `path` can be remuxed to, or None if it
+    already is audio-only (or has no copyable target)"""
+    return REMUX_EXTENSIONS.get(os.path.splitext(path)[1].lower())
+
+
+class LocalAudioConverter:
+    """Runs at most `max_jobs` ffmpeg processes at a time"""
+
+    def __init__(self, max_jobs=None, ffmpeg=None, bitrate=DEFAULT_BITRATE, timeout=DEFAULT_TIMEOUT):
+        self.ffmpeg = ffmpeg or find_ffmpeg()
+        self.max_jobs = max(1, int(max_jobs or os.cpu_count() or 1))
+        self.bitrate = bitrate
+        self.timeout = timeout
+        self.conversions = 0
+        self.failures = 0
+        self._slots = threading.BoundedSemaphore(self.max_jobs)
+        self._lock = threading.Lock()
+
+    def available(self):
+        return bool(self.ffmpeg)
+
+    def convert_to_mp3(self, input_path, output_path):
+        """Transcode to MP3; returns True on success"""
+        return self._run(input_path, output_path,
+                         ['-vn', '-codec:a', 'libmp3lame', '-b:a', self.bitrate])
+
+    def remux(self, input_path, output_path):
+        """Copy the audio stream into `output_path`'s container; returns True on success"""
+        return self._run(input_path, output_path, ['-vn', '-codec:a', 'copy'])
+
+    def _run(self, input_path, output_path, codec_args):
+        if not self.ffmpeg:
+            return False
+        command = [self.ffmpeg, '-hide_banner', '-loglevel', 'error', '-nostdin', '-y',
+                   '-i', input_path, *codec_args, '-threads', '1', output_path]
+        with self._slots:
+            try:
+                result = subprocess.run(command, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE,
+                                        timeout=self.timeout)
+                ok = result.returncode == 0 and os.path.exists(output_path)
+                error = result.stderr.decode('utf-8', 'replace').strip().splitlines()[-1:] if not ok else None
+            except (OSError, subprocess.TimeoutExpired) as e:
+                ok, error = False, [str(e)]
+
+        with self._lock:
+            if ok:
+                self.conversions += 1
+            else:
+                self.failures += 1
+        if not ok:
+            print(f"❌ Local FFmpeg failed for {os.path.basename(input_path)}: {' '.join(error or ['unknown error'])}")
+            try:
+                os.remove(output_path)
+            except OSError:
+                pass
+        return ok
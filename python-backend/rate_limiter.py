@@ -0,0 +1,193 @@
+#!/usr/bin/env python3
+"""
+Rate Limiter - adaptive token buckets per upstream service
+Each upstream (Spotify API, YouTube search, YouTube media, album art CDN)
+gets one limiter shared by all workers. Calls wait for a token, throttling
+responses (429/403) honour Retry-After or back off exponentially with
+jitter, and the rate is lowered or raised from the recent error rate.
+"""
+
+import random
+import re
+import threading
+import time
+from collections import deque
+
+_HTTP_STATUS_RE = re.compile(r"HTTP Error (\d{3})")
+
+# Phrases YouTube uses instead of a 429 when it throttles an IP
+_THROTTLE_PHRASES = ("confirm you're not a bot", "too many requests", "rate-limit", "rate limit")
+
+_NETWORK_ERRORS = {'ConnectionError', 'Timeout', 'ConnectTimeout', 'ReadTimeout',
+                   'ChunkedEncodingError', 'IncompleteRead', 'TransportError'}
+
+
+def classify_error(error):
+    """Return (status, retry_after_seconds) for an exception from spotipy,
+    requests or yt-dlp; status is 0 for network errors, None if unknown"""
+    headers = getattr(error, 'headers', None)
+    status = getattr(error, 'http_status', None)  # spotipy.SpotifyException
+
+    response = getattr(error, 'response', None)  # requests.HTTPError
+    if status is None and response is not None:
+        status = getattr(response, 'status_code', None) or getattr(response, 'status', None)
+        headers = headers or getattr(response, 'headers', None)
+
+    # yt-dlp wraps the original error in exc_info
+    cause = (getattr(error, 'exc_info', None) or (None, None))[1]
+    if status is None and cause is not None and cause is not error:
+        status, retry_after = classify_error(cause)
+        if status is not None:
+            return status, retry_after
+
+    if status is None:
+        status = getattr(error, 'status', None) or getattr(error, 'code', None)
+        if not isinstance(status, int):
+            status = None
+    if status is None:
+        message = str(error)
+        match = _HTTP_STATUS_RE.search(message)
+        if match:
+            status = int(match.group(1))
+        elif any(phrase in message.lower() for phrase in _THROTTLE_PHRASES):
+            status = 429
+        elif type(error).__name__ in _NETWORK_ERRORS:
+            status = 0
+
+    retry_after = None
+    if headers:
+        value = headers.get('Retry-After') if hasattr(headers, 'get') else None
+        try:
+            retry_after = float(value) if value is not None else None
+        except (TypeError, ValueError):
+            retry_after = None
+    return status, retry_after
+
+
+class AdaptiveRateLimiter:
+    """Token bucket whose rate adapts to the upstream's recent error rate"""
+
+    def __init__(self, name, rate, burst=None, min_rate=None, max_rate=None,
+                 throttle_statuses=(429,), retry_statuses=(500, 502, 503, 504),
+                 max_retries=5, base_backoff=1.0, max_backoff=120.0, window=50):
+        self.name = name
+        self.rate = float(rate)
+        self.burst = float(burst or max(1.0, rate))
+        self.min_rate = float(min_rate or rate / 16.0)
+        self.max_rate = float(max_rate or rate * 2.0)
+        self.throttle_statuses = set(throttle_statuses)
+        self.retry_statuses = set(retry_statuses) | {0}
+        self.max_retries = max_retries
+        self.base_backoff = base_backoff
+        self.max_backoff = max_backoff
+        self.throttled = 0
+        self.calls = 0
+        self._tokens = self.burst
+        self._updated = time.monotonic()
+        self._cooldown_until = 0.0
+        self._consecutive_throttles = 0
+        self._outcomes = deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """Block until a token is available (and any cooldown has passed)"""
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if now < self._cooldown_until:
+                    wait = self._cooldown_until - now
+                elif self._tokens >= 1.0:
+                    self._tokens -= 1.0
+                    self.calls += 1
+                    return
+                else:
+                    wait = (1.0 - self._tokens) / self.rate
+            time.sleep(wait)
+
+    def call(self, func, *args, **kwargs):
+        """Rate-limited call with backoff and retry on throttling/server errors"""
+        attempt = 0
+        while True:
+            self.acquire()
+            try:
+                result = func(*args, **kwargs)
+            except Exception as e:
+                status, retry_after = classify_error(e)
+                retryable = status in self.throttle_statuses or status in self.retry_statuses
+                self.record_error(status, retry_after, attempt)
+                if not retryable or attempt >= self.max_retries:
+                    raise
+                attempt += 1
+                continue
+            self.record_success()
+            return result
+
+    def record_success(self):
+        with self._lock:
+            self._consecutive_throttles = 0
+            self._outcomes.append(False)
+            # Additive increase unless the upstream is clearly struggling
+            if self.error_rate() < 0.2:
+                self.rate = min(self.max_rate, self.rate + self.max_rate / 20.0)
+
+    def record_error(self, status, retry_after=None, attempt=0):
+        """Register a failed call; throttles pause every caller of this limiter"""
+        throttled = status in self.throttle_statuses
+        if not throttled and status not in self.retry_statuses:
+            # Not the upstream's fault (e.g. 404, video unavailable)
+            return
+        with self._lock:
+            self._outcomes.append(True)
+            # Throttles that land during an existing pause came from the
+            # same burst of requests; only the first one lowers the rate
+            in_cooldown = time.monotonic() < self._cooldown_until
+            if throttled:
+                self.throttled += 1
+                self._consecutive_throttles += 1
+                if not in_cooldown:
+                    self.rate = max(self.min_rate, self.rate / 2.0)
+                level = self._consecutive_throttles - 1
+            else:
+                level = attempt
+                if self.error_rate() > 0.2 and not in_cooldown:
+                    self.rate = max(self.min_rate, self.rate * 0.75)
+            if retry_after is not None:
+                delay = min(self.max_backoff, retry_after)
+            else:
+                # Exponential backoff with full jitter
+                delay = random.uniform(0, min(self.max_backoff, self.base_backoff * 2 ** level))
+            self._cooldown_until = max(self._cooldown_until, time.monotonic() + delay)
+            self._tokens = 0.0
+            rate = self.rate
+        print(f"⏳ {self.name} returned {status or 'a network error'}, "
+              f"backing off {delay:.1f}s (rate now {rate:.2f}/s)")
+
+    def error_rate(self):
+        if not self._outcomes:
+            return 0.0
+        return sum(self._outcomes) / len(self._outcomes)
+
+    def cooldown_remaining(self):
+        return max(0.0, self._cooldown_until - time.monotonic())
+
+    def describe(self):
+        """Short state summary for progress output"""
+        text = f"{self.name} {self.rate:.2f}/s"
+        cooldown = self.cooldown_remaining()
+        if cooldown > 0:
+            text += f" (paused {cooldown:.0f}s)"
+        return text
+
+
+def default_limiters():
+    """One limiter per upstream the downloader talks to"""
+    return {
+        'spotify': AdaptiveRateLimiter('spotify', rate=10, burst=10, max_rate=20),
+        'youtube_search': AdaptiveRateLimiter(
+            'youtube_search', rate=2, burst=3, max_rate=5, throttle_statuses=(429, 403)),
+        'youtube_media': AdaptiveRateLimiter(
+            'youtube_media', rate=2, burst=4, max_rate=6, throttle_statuses=(429, 403)),
+        'art_cdn': AdaptiveRateLimiter('art_cdn', rate=10, burst=10, max_rate=30),
+    }
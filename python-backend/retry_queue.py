@@ -0,0 +1,195 @@
+#!/usr/bin/env python3
+"""
+Retry Queue - durable record of failed tracks and when to try them again
+Each failure bumps the track's attempt count and pushes its next eligible
+time out exponentially; tracks past the attempt limit are given up on, so
+regular syncs stop spending searches and downloads on dead tracks.
+"""
+
+import json
+import sqlite3
+import threading
+import time
+
+# Failures where YouTube simply had nothing usable; the result rarely
+# changes within hours, so these back off from a day instead of minutes
+SEARCH_ERRORS = ('no_results', 'no_match')
+
+DEFAULT_BASE_DELAY = 15 * 60
+DEFAULT_SEARCH_BASE_DELAY = 24 * 3600
+DEFAULT_MAX_DELAY = 30 * 24 * 3600
+DEFAULT_MAX_ATTEMPTS = 6
+
+
+class RetryQueue:
+    """SQLite-backed queue of failed tracks with exponential backoff"""
+
+    def __init__(self, db_path, base_delay=DEFAULT_BASE_DELAY,
+                 search_base_delay=DEFAULT_SEARCH_BASE_DELAY, max_delay=DEFAULT_MAX_DELAY,
+                 max_attempts=DEFAULT_MAX_ATTEMPTS, journal_mode='WAL'):
+        self.db_path = db_path
+        self.base_delay = base_delay
+        self.search_base_delay = search_base_delay
+        self.max_delay = max_delay
+        self.max_attempts = max_attempts
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(db_path, check_same_thread=False, timeout=30)
+        self._conn.row_factory = sqlite3.Row
+        with self._lock, self._conn:
+            self._conn.execute(f"PRAGMA journal_mode={journal_mode}")
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS retries (
+                    spotify_id TEXT PRIMARY KEY,
+                    track TEXT NOT NULL,
+                    attempts INTEGER NOT NULL,
+                    error_class TEXT,
+                    last_error TEXT,
+                    first_failed_at REAL NOT NULL,
+                    last_attempt_at REAL NOT NULL,
+                    next_eligible_at REAL NOT NULL,
+                    gave_up INTEGER NOT NULL DEFAULT 0
+                )
+            """)
+            self._conn.execute(
+                "CREATE INDEX IF NOT EXISTS retries_due ON retries (gave_up, next_eligible_at)"
+            )
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    def backoff(self, attempts, error_class):
+        """Seconds to wait after the `attempts`-th failure"""
+        base = self.search_base_delay if error_class in SEARCH_ERRORS else self.base_delay
+        return min(self.max_delay, base * 2 ** max(0, attempts - 1))
+
+    def record_failure(self, track, error_class, message=None, now=None):
+        """Count a failed attempt for `track` (a dict-like with 'spotify_id')
+        and return the updated entry, or None if the track has no ID"""
+        spotify_id = track.get('spotify_id')
+        if not spotify_id:
+            return None
+        now = time.time() if now is None else now
+        track_json = json.dumps(track.to_dict() if hasattr(track, 'to_dict') else dict(track))
+        with self._lock, self._conn:
+            row = self._conn.execute(
+                "SELECT attempts, first_failed_at FROM retries WHERE spotify_id = ?", (spotify_id,)
+            ).fetchone()
+            attempts = (row['attempts'] if row else 0) + 1
+            first_failed_at = row['first_failed_at'] if row else now
+            gave_up = attempts >= self.max_attempts
+            next_eligible_at = now + self.backoff(attempts, error_class)
+            self._conn.execute(
+                "INSERT OR REPLACE INTO retries "
+                "(spotify_id, track, attempts, error_class, last_error, first_failed_at, "
+                "last_attempt_at, next_eligible_at, gave_up) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (spotify_id, track_json, attempts, error_class, message, first_failed_at,
+                 now, next_eligible_at, int(gave_up)),
+            )
+        return {'spotify_id': spotify_id, 'attempts': attempts, 'error_class': error_class,
+                'next_eligible_at': next_eligible_at, 'gave_up': gave_up}
+
+    def resolve(self, spotify_id):
+        """Forget a track once it has been downloaded"""
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM retries WHERE spotify_id = ?", (spotify_id,))
+
+    def resolve_many(self, spotify_ids):
+        """Forget every track in `spotify_ids` (e.g. found in the library
+        without a download); returns the number of entries removed"""
+        spotify_ids = [sid for sid in spotify_ids if sid]
+        queued = []
+        with self._lock:
+            # Read first, so a sync full of untroubled tracks takes no write lock
+            for start in range(0, len(spotify_ids), 500):
+                chunk = spotify_ids[start:start + 500]
+                queued.extend(row[0] for row in self._conn.execute(
+                    "SELECT spotify_id FROM retries WHERE spotify_id IN (%s)" % ', '.join('?' * len(chunk)),
+                    chunk,
+                ))
+            if queued:
+                with self._conn:
+                    for start in range(0, len(queued), 500):
+                        chunk = queued[start:start + 500]
+                        self._conn.execute(
+                            "DELETE FROM retries WHERE spotify_id IN (%s)" % ', '.join('?' * len(chunk)),
+                            chunk,
+                        )
+        return len(queued)
+
+    def get(self, spotify_id):
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT * FROM retries WHERE spotify_id = ?", (spotify_id,)
+            ).fetchone()
+        return self._entry(row) if row else None
+
+    def due(self, now=None, limit=None):
+        """Entries eligible for another attempt, most promising first:
+        download errors before search errors, then fewest attempts"""
+        now = time.time() if now is None else now
+        query = (
+            "SELECT * FROM retries WHERE gave_up = 0 AND next_eligible_at <= ? "
+            "ORDER BY CASE WHEN error_class IN (%s) THEN 1 ELSE 0 END, attempts, next_eligible_at"
+            % ', '.join('?' * len(SEARCH_ERRORS))
+        )
+        params = [now, *SEARCH_ERRORS]
+        if limit is not None:
+            query += " LIMIT ?"
+            params.append(limit)
+        with self._lock:
+            rows = self._conn.execute(query, params).fetchall()
+        return [self._entry(row) for row in rows]
+
+    def blocked(self, spotify_ids, now=None):
+        """IDs from `spotify_ids` that are given up on or not yet due"""
+        spotify_ids = [sid for sid in spotify_ids if sid]
+        if not spotify_ids:
+            return set()
+        now = time.time() if now is None else now
+        blocked = set()
+        with self._lock:
+            # Stay well below SQLite's bound-parameter limit
+            for start in range(0, len(spotify_ids), 500):
+                chunk = spotify_ids[start:start + 500]
+                rows = self._conn.execute(
+                    "SELECT spotify_id FROM retries WHERE (gave_up = 1 OR next_eligible_at > ?) "
+                    "AND spotify_id IN (%s)" % ', '.join('?' * len(chunk)),
+                    [now, *chunk],
+                ).fetchall()
+                blocked.update(row[0] for row in rows)
+        return blocked
+
+    def revive(self, spotify_id=None):
+        """Make given-up tracks (or one track) eligible again; returns the count"""
+        with self._lock, self._conn:
+            if spotify_id is None:
+                cursor = self._conn.execute(
+                    "UPDATE retries SET gave_up = 0, attempts = 0, next_eligible_at = 0 WHERE gave_up = 1"
+                )
+            else:
+                cursor = self._conn.execute(
+                    "UPDATE retries SET gave_up = 0, attempts = 0, next_eligible_at = 0 WHERE spotify_id = ?",
+                    (spotify_id,),
+                )
+        return cursor.rowcount
+
+    def stats(self, now=None):
+        now = time.time() if now is None else now
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT "
+                "COALESCE(SUM(CASE WHEN gave_up = 0 AND next_eligible_at <= ? THEN 1 ELSE 0 END), 0), "
+                "COALESCE(SUM(CASE WHEN gave_up = 0 AND next_eligible_at > ? THEN 1 ELSE 0 END), 0), "
+                "COALESCE(SUM(gave_up), 0) FROM retries",
+                (now, now),
+            ).fetchone()
+        return {'due': row[0], 'waiting': row[1], 'given_up': row[2]}
+
+    @staticmethod
+    def _entry(row):
+        entry = dict(row)
+        entry['track'] = json.loads(entry['track'])
+        entry['gave_up'] = bool(entry['gave_up'])
+        return entry
@@ -0,0 +1,168 @@
+#!/usr/bin/env python3
+"""
+Run Metrics - per-track, per-stage timings and the end-of-run report
+Stages are timed with RunMetrics.stage(); attach a MetricsHook subclass to
+stream the same events into your own metrics sink.
+"""
+
+import json
+import math
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime, timezone
+
+
+class MetricsHook:
+    """Base class for metrics sinks; override the events you need.
+
+    Hooks are called from worker threads and must be thread-safe.
+    """
+
+    def on_stage(self, track_id, stage, seconds, nbytes):
+        pass
+
+    def on_track(self, track_id, ok, reason, seconds):
+        pass
+
+    def on_run_end(self, report):
+        pass
+
+
+class StageTiming:
+    """Mutable result of one timed stage; set `bytes` inside the block"""
+
+    __slots__ = ('stage', 'seconds', 'bytes')
+
+    def __init__(self, stage):
+        self.stage = stage
+        self.seconds = 0.0
+        self.bytes = 0
+
+
+def percentile(sorted_values, fraction):
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return 0.0
+    index = max(0, math.ceil(fraction * len(sorted_values)) - 1)
+    return sorted_values[min(index, len(sorted_values) - 1)]
+
+
+class RunMetrics:
+    """Collects stage timings and track outcomes for one run"""
+
+    def __init__(self, hooks=None):
+        self.hooks = list(hooks or [])
+        self.started = time.time()
+        self._clock_start = time.perf_counter()
+        self._lock = threading.Lock()
+        self._stages = {}       # stage -> [seconds]
+        self._stage_bytes = {}  # stage -> total bytes
+        self._tracks = {}       # track_id -> per-track record
+        self._reasons = {}
+        self.skipped = 0
+
+    def _emit(self, event, *args):
+        for hook in self.hooks:
+            try:
+                getattr(hook, event)(*args)
+            except Exception as e:
+                print(f"⚠️  Metrics hook {type(hook).__name__}.{event} failed: {e}")
+
+    def _track(self, track):
+        track_id = track.spotify_id or track.name
+        record = self._tracks.get(track_id)
+        if record is None:
+            record = self._tracks[track_id] = {
+                'spotify_id': track.spotify_id,
+                'name': f"{track.artist} - {track.name}",
+                'ok': None,
+                'reason': None,
+                'seconds': 0.0,
+                'stages': {},
+            }
+        return track_id, record
+
+    @contextmanager
+    def stage(self, track, name):
+        """Time a block of work for `track` under stage `name`"""
+        timing = StageTiming(name)
+        start = time.perf_counter()
+        try:
+            yield timing
+        finally:
+            timing.seconds = time.perf_counter() - start
+            self.record_stage(track, name, timing.seconds, timing.bytes)
+
+    def record_stage(self, track, name, seconds, nbytes=0):
+        with self._lock:
+            track_id, record = self._track(track)
+            stage = record['stages'].setdefault(name, {'seconds': 0.0, 'bytes': 0})
+            stage['seconds'] += seconds
+            stage['bytes'] += nbytes
+            self._stages.setdefault(name, []).append(seconds)
+            self._stage_bytes[name] = self._stage_bytes.get(name, 0) + nbytes
+        self._emit('on_stage', track_id, name, seconds, nbytes)
+
+    def track_finished(self, track, ok, reason=None, seconds=None):
+        """Record a track's outcome; `reason` is a short failure class"""
+        with self._lock:
+            track_id, record = self._track(track)
+            record['ok'] = bool(ok)
+            record['reason'] = None if ok else (reason or 'unknown')
+            if seconds is None:
+                seconds = sum(stage['seconds'] for stage in record['stages'].values())
+            record['seconds'] = seconds
+            if not ok:
+                self._reasons[record['reason']] = self._reasons.get(record['reason'], 0) + 1
+        self._emit('on_track', track_id, ok, record['reason'], seconds)
+
+    def report(self):
+        """Build the machine-readable run report"""
+        with self._lock:
+            wall = time.perf_counter() - self._clock_start
+            tracks = list(self._tracks.values())
+            stages = {}
+            for name, values in self._stages.items():
+                ordered = sorted(values)
+                stages[name] = {
+                    'count': len(ordered),
+                    'total_seconds': round(sum(ordered), 3),
+                    'p50_seconds': round(percentile(ordered, 0.50), 3),
+                    'p95_seconds': round(percentile(ordered, 0.95), 3),
+                    'max_seconds': round(ordered[-1], 3),
+                    'bytes': self._stage_bytes.get(name, 0),
+                }
+            reasons = dict(sorted(self._reasons.items(), key=lambda item: -item[1]))
+            skipped = self.skipped
+
+        finished = [track for track in tracks if track['ok'] is not None]
+        successful = sum(1 for track in finished if track['ok'])
+        downloaded = stages.get('download', {}).get('bytes', 0)
+        return {
+            'started_at': datetime.fromtimestamp(self.started, timezone.utc).isoformat(),
+            'finished_at': datetime.now(timezone.utc).isoformat(),
+            'wall_seconds': round(wall, 3),
+            'tracks': {
+                'processed': len(finished),
+                'successful': successful,
+                'failed': len(finished) - successful,
+                'skipped': skipped,
+            },
+            'throughput': {
+                'tracks_per_second': round(successful / wall, 4) if wall else 0.0,
+                'downloaded_bytes': downloaded,
+                'download_bytes_per_second': round(downloaded / wall, 1) if wall else 0.0,
+            },
+            'stages': stages,
+            'failure_reasons': reasons,
+            'track_timings': finished,
+        }
+
+    def write_report(self, path):
+        """Write the report as JSON, notify hooks and return it"""
+        report = self.report()
+        with open(path, 'w') as f:
+            json.dump(report, f, indent=2)
+        self._emit('on_run_end', report)
+        return report
@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+"""
+Search Cache - persistent cache of YouTube search results
+Stores the trimmed candidate metadata per normalized query so reruns and
+retries skip the slowest, most throttled step. Entries expire after a TTL
+and the least recently used ones are evicted past a size bound.
+"""
+
+import json
+import sqlite3
+import threading
+import time
+
+# Candidate fields kept in the cache (everything track_matcher and the
+# downloader need)
+CANDIDATE_FIELDS = (
+    'id', 'title', 'duration', 'channel', 'uploader', 'channel_is_verified',
+    'webpage_url',
+)
+
+DEFAULT_TTL = 7 * 24 * 3600
+DEFAULT_MAX_ENTRIES = 50000
+
+
+def normalize_query(query):
+    """Case- and whitespace-insensitive cache key for a search query"""
+    return ' '.join(str(query).lower().split())
+
+
+def trim_candidate(entry):
+    return {field: entry.get(field) for field in CANDIDATE_FIELDS if entry.get(field) is not None}
+
+
+class SearchCache:
+    """SQLite-backed TTL + LRU cache of search results"""
+
+    def __init__(self, db_path, ttl=DEFAULT_TTL, max_entries=DEFAULT_MAX_ENTRIES, journal_mode='WAL'):
+        self.db_path = db_path
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(db_path, check_same_thread=False, timeout=30)
+        with self._lock, self._conn:
+            self._conn.execute(f"PRAGMA journal_mode={journal_mode}")
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS searches (
+                    query TEXT PRIMARY KEY,
+                    results TEXT NOT NULL,
+                    created_at REAL NOT NULL,
+                    last_used REAL NOT NULL
+                )
+            """)
+            self._conn.execute(
+                "CREATE INDEX IF NOT EXISTS searches_last_used ON searches (last_used)"
+            )
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    def get(self, query, force_refresh=False):
+        """Return cached candidates for `query`, or None on a miss.
+
+        `force_refresh` always misses so the caller searches again.
+        """
+        key = normalize_query(query)
+        now = time.time()
+        with self._lock:
+            row = None
+            if not force_refresh:
+                row = self._conn.execute(
+                    "SELECT results, created_at FROM searches WHERE query = ?", (key,)
+                ).fetchone()
+            if row is None or now - row[1] > self.ttl:
+                self.misses += 1
+                return None
+            self.hits += 1
+            with self._conn:
+                self._conn.execute(
+                    "UPDATE searches SET last_used = ? WHERE query = ?", (now, key)
+                )
+        return json.loads(row[0])
+
+    def put(self, query, candidates):
+        """Store trimmed candidates for `query`, evicting LRU entries if full"""
+        key = normalize_query(query)
+        now = time.time()
+        payload = json.dumps([trim_candidate(entry) for entry in candidates])
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO searches (query, results, created_at, last_used) "
+                "VALUES (?, ?, ?, ?)",
+                (key, payload, now, now),
+            )
+            self._evict()
+
+    def _evict(self):
+        # Called with the lock held; trims to 90% so eviction runs rarely
+        count = self._conn.execute("SELECT COUNT(*) FROM searches").fetchone()[0]
+        if count <= self.max_entries:
+            return
+        excess = count - int(self.max_entries * 0.9)
+        self._conn.execute(
+            "DELETE FROM searches WHERE query IN "
+            "(SELECT query FROM searches ORDER BY last_used LIMIT ?)",
+            (excess,),
+        )
+
+    def purge_expired(self):
+        """Delete entries older than the TTL; returns how many were removed"""
+        with self._lock, self._conn:
+            cursor = self._conn.execute(
+                "DELETE FROM searches WHERE created_at < ?", (time.time() - self.ttl,)
+            )
+        return cursor.rowcount
+
+    def stats(self):
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / total if total else 0.0,
+            }
@@ -8,44 +8,151 @@ import os
 import sys
 import json
 import time
-import requests
-import spotipy
-from spotipy.oauth2 import SpotifyOAuth
-import yt_dlp
+import argparse
+import functools
+import socket
+import threading
 from pathlib import Path
-import subprocess
-from urllib.request import urlretrieve
-import tempfile
-
-# Import cloud audio converter for conversion
-try:
-    from cloud_audio_converter import convert_audio_to_mp3_cloud, is_cloud_audio_available
-    CLOUD_CONVERTER_AVAILABLE = True
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+# spotipy, yt_dlp and the cloud converter are imported where first used, so
+# the CLI (and the Android app) start without loading them
+
+from download_pipeline import DownloadPipeline, PipelineStage
+from library_manifest import LibraryManifest
+from track_sources import SpotifyCatalog, TrackRecord, parse_source
+from track_matcher import DEFAULT_THRESHOLD, rank_candidates
+from search_cache import SearchCache, trim_candidate
+from ydl_pool import YoutubeDLPool, set_output_template
+from album_art_cache import AlbumArtCache
+from rate_limiter import default_limiters
+from run_metrics import RunMetrics
+from retry_queue import SEARCH_ERRORS, RetryQueue
+from local_audio_converter import LocalAudioConverter, remux_extension
+import audio_tagger
+from work_queue import DEFAULT_LEASE_SECONDS, LEASE_LOST, LeaseKeeper, WorkQueue, WorkQueueHook
+
+
+def youtube_dl(options):
+    """Build a yt_dlp.YoutubeDL (yt-dlp is imported when the first one is needed)"""
+    import yt_dlp
+    return yt_dlp.YoutubeDL(options)
+
+
+@functools.lru_cache(maxsize=None)
+def cloud_converter():
+    """The cloud_audio_converter module, imported on first use (None if missing)"""
+    try:
+        import cloud_audio_converter
+    except ImportError:
+        print("⚠️ Cloud audio converter not available - M4A files will not be converted to MP3")
+        return None
     print("☁️ Cloud audio converter loaded")
-except ImportError:
-    print("⚠️ Cloud audio converter not available - M4A files will not be converted to MP3")
-    CLOUD_CONVERTER_AVAILABLE = False
-    
-    def convert_audio_to_mp3_cloud(*args, **kwargs):
-        return False
-    
-    def is_cloud_audio_available():
-        return False
+    return cloud_audio_converter
+
+
+class DownloadJob:
+    """Per-track state handed from one download stage to the next"""
+
+    __slots__ = ('song_info', 'safe_filename', 'final_path', 'temp_file',
+                 'candidates', 'video', 'temp_audio', 'ok', 'error', 'stage_bytes', 'started')
+
+    def __init__(self, song_info, safe_filename, final_path, temp_file):
+        self.song_info = song_info
+        self.safe_filename = safe_filename
+        self.final_path = final_path
+        self.temp_file = temp_file
+        self.candidates = []
+        self.video = None
+        self.temp_audio = None
+        self.ok = False
+        self.error = None  # Short failure reason for the run report
+        self.stage_bytes = 0  # Bytes produced by the current stage
+        self.started = time.perf_counter()
+
 
 class UltimateSpotifyDownloader:
-    def __init__(self):
+    def __init__(self, workers=1, incremental=False, refresh_search=False, link_duplicates=False,
+                 sources=None, converter='auto', remux_only=False):
         self.spotify = None
         self.download_dir = "downloaded_music"
         self.temp_dir = "temp_downloads"
         self.config_file = "spotify_config.json"
         self.failed_songs = []
+        self.report_file = "run_report.json"
+        self.metrics_hooks = []  # MetricsHook sinks for stage and track events
         self.custom_output_uri = None  # For user-selected folder
-        self.setup_directories()
+        self.workers = max(1, int(workers))  # >1 enables the pipelined mode
+        self.queue_size = 8  # Max tracks waiting between two pipeline stages
+        self.incremental = incremental  # Only fetch songs liked since the last sync
+        self.sources = list(sources or [('liked', None)])  # (kind, id) pairs from track_sources.parse_source
+        self.page_size = 50  # Spotify's maximum for saved tracks
+        self.fetch_workers = 4  # Concurrent page requests on a cold fetch
+        self.liked_total = None  # Library size, once the first page reports it
+        self.staged_liked_cursor = None  # Newest liked page, saved once the run completes
+        self.search_results = 5  # YouTube candidates fetched per track (metadata only)
+        self.match_threshold = DEFAULT_THRESHOLD  # Minimum track_matcher score to download
+        self.refresh_search = refresh_search  # Ignore cached searches and search again
+        self.isrc_search = True  # Search YouTube by ISRC before the "artist - name" query
+        self.link_duplicates = link_duplicates  # Hardlink same-ISRC tracks under their own names
+        self._isrc_owners = {}  # ISRC -> Spotify ID downloading it in this run
+        self._isrc_followers = {}  # Spotify ID -> (progress, same-ISRC songs waiting on it)
+        self.converter = converter  # 'auto', 'local', 'cloud' or 'none' (keep the downloaded format)
+        self.remux_only = remux_only  # Copy audio into an audio-only container instead of transcoding
+        self.local_converter = LocalAudioConverter()
+        self._lock = threading.Lock()
+        self.lease_keeper = None  # Set while running as a work queue worker
+        self.shared_stores = False  # Stores are shared with work processes (set by coordinate/work)
+        self.untagged = 0  # Tracks saved without tags in this run
+        self.fresh_search_ids = set()  # Retried tracks whose cached search found nothing usable
+        self.limiters = default_limiters()  # Shared pacing per upstream service
+        self.metrics = RunMetrics(self.metrics_hooks)
         
     def setup_directories(self):
         """Create necessary directories"""
         Path(self.download_dir).mkdir(exist_ok=True)
         Path(self.temp_dir).mkdir(exist_ok=True)
+
+    # Stores and clients are opened on first use, so commands that never
+    # touch them (and the Android app's startup) skip their cost
+
+    def store_journal_mode(self):
+        """WAL, unless the download folder's stores are shared with work
+        processes: WAL's index lives in shared memory on one host, so
+        workers on other hosts sharing the folder need a rollback journal.
+        A folder that has held the default work queue keeps using one,
+        so a plain sync cannot switch it back under running workers."""
+        if self.shared_stores or os.path.exists(self.work_queue_path()):
+            return 'DELETE'
+        return 'WAL'
+
+    @functools.cached_property
+    def manifest(self):
+        self.setup_directories()
+        return LibraryManifest(os.path.join(self.download_dir, ".library_manifest.db"),
+                               journal_mode=self.store_journal_mode())
+
+    @functools.cached_property
+    def search_cache(self):
+        self.setup_directories()
+        return SearchCache(os.path.join(self.download_dir, ".search_cache.db"),
+                           journal_mode=self.store_journal_mode())
+
+    @functools.cached_property
+    def retry_queue(self):
+        self.setup_directories()
+        return RetryQueue(os.path.join(self.download_dir, ".retry_queue.db"),
+                          journal_mode=self.store_journal_mode())
+
+    @functools.cached_property
+    def ydl_pool(self):
+        return YoutubeDLPool(youtube_dl)
+
+    @functools.cached_property
+    def art_cache(self):
+        self.setup_directories()
+        return AlbumArtCache(os.path.join(self.temp_dir, "album_art"), pool_size=self.workers,
+                             limiter=self.limiters['art_cdn'])
         
     def setup_spotify_auth(self):
         """Setup Spotify API authentication"""
@@ -74,16 +181,23 @@ class UltimateSpotifyDownloader:
                 json.dump(config, f, indent=2)
         
         try:
+            import requests
+            import spotipy
+            from spotipy.oauth2 import SpotifyOAuth
+            
             auth_manager = SpotifyOAuth(
                 client_id=config['client_id'],
                 client_secret=config['client_secret'],
                 redirect_uri=config['redirect_uri'],
-                scope="user-library-read",
+                scope="user-library-read playlist-read-private playlist-read-collaborative",
                 cache_path=".spotify_cache"
             )
             
-            self.spotify = spotipy.Spotify(auth_manager=auth_manager)
-            user = self.spotify.current_user()
+            # A plain session has no urllib3 Retry, so 429s and 5xx errors
+            # (with their Retry-After) reach the shared limiter in
+            # spotify_call instead of being slept through inside spotipy
+            self.spotify = spotipy.Spotify(auth_manager=auth_manager, requests_session=requests.Session())
+            user = self.spotify_call(self.spotify.current_user)
             print(f"✅ Connected to Spotify as: {user['display_name']}")
             return True
             
@@ -91,59 +205,190 @@ class UltimateSpotifyDownloader:
             print(f"❌ Spotify authentication failed: {e}")
             return False
     
-    def get_liked_songs(self):
-        """Get all liked songs from Spotify"""
-        print("📥 Fetching your liked songs...")
-        
-        liked_songs = []
+    def spotify_call(self, func, *args, **kwargs):
+        """Call the Spotify API through the shared rate limiter, which retries
+        rate limits (429), server errors (5xx) and network failures"""
+        return self.limiters['spotify'].call(func, *args, **kwargs)
+
+    def fetch_saved_tracks_page(self, offset):
+        """Fetch one page of the user's saved tracks"""
+        return self.spotify_call(
+            self.spotify.current_user_saved_tracks, limit=self.page_size, offset=offset
+        )
+
+    def parse_saved_page(self, page):
+        """Turn a saved-tracks API page into TrackRecords"""
+        return [
+            TrackRecord.from_api(item['track'], added_at=item.get('added_at'))
+            for item in page['items'] if item.get('track')
+        ]
+
+    def load_liked_cursor(self):
+        """Return the stored {'added_at', 'ids'} cursor, or None"""
+        raw = self.manifest.get_state('liked_songs_cursor')
+        return json.loads(raw) if raw else None
+
+    def save_liked_cursor(self, newest_page):
+        """Remember the newest liked songs so the next sync can stop there"""
+        if not newest_page:
+            return
+        newest = max(track.added_at or '' for track in newest_page)
+        ids = [track.spotify_id for track in newest_page if track.added_at == newest]
+        self.manifest.set_state('liked_songs_cursor', json.dumps({'added_at': newest, 'ids': ids}))
+
+    def commit_liked_cursor(self):
+        """Store the cursor staged by a fully fetched liked-songs source"""
+        newest_page, self.staged_liked_cursor = self.staged_liked_cursor, None
+        self.save_liked_cursor(newest_page)
+
+    def iter_liked_since(self, cursor):
+        """Page newest-first, yielding new tracks until the first
+        already-seen one"""
         offset = 0
-        limit = 50
+        seen_ids = set(cursor.get('ids') or [])
         
         while True:
-            try:
-                results = self.spotify.current_user_saved_tracks(limit=limit, offset=offset)
-                
-                if not results['items']:
+            page = self.parse_saved_page(self.fetch_saved_tracks_page(offset))
+            if not page:
+                return
+            
+            new_tracks = []
+            for track in page:
+                if track.spotify_id in seen_ids or (track.added_at or '') < cursor['added_at']:
+                    if new_tracks:
+                        yield new_tracks
+                    return
+                new_tracks.append(track)
+            yield new_tracks
+            offset += self.page_size
+
+    def iter_all_liked(self):
+        """Yield every page, requesting pages concurrently once the first
+        response reveals the total"""
+        first = self.fetch_saved_tracks_page(0)
+        self.liked_total = first.get('total') or len(first['items'])
+        yield self.parse_saved_page(first)
+        
+        offsets = iter(range(self.page_size, self.liked_total, self.page_size))
+        # Keep a bounded window of requests in flight so pages are not
+        # buffered faster than the download stage consumes them
+        with ThreadPoolExecutor(max_workers=self.fetch_workers) as executor:
+            window = deque()
+            for offset in offsets:
+                window.append(executor.submit(self.fetch_saved_tracks_page, offset))
+                if len(window) >= self.fetch_workers * 2:
                     break
-                    
-                for item in results['items']:
-                    track = item['track']
-                    # Get the highest quality album artwork
-                    album_art_url = None
-                    if track['album']['images']:
-                        # Spotify provides images in descending order of size
-                        album_art_url = track['album']['images'][0]['url']
-                    
-                    song_info = {
-                        'name': track['name'],
-                        'artist': ', '.join([artist['name'] for artist in track['artists']]),
-                        'album': track['album']['name'],
-                        'duration': track['duration_ms'],
-                        'spotify_id': track['id'],
-                        'album_art_url': album_art_url
-                    }
-                    liked_songs.append(song_info)
-                
-                offset += limit
-                print(f"📥 Fetched {len(liked_songs)} songs so far...")
-                
-            except Exception as e:
-                print(f"❌ Error fetching songs: {e}")
-                break
+            while window:
+                page = window.popleft().result()
+                next_offset = next(offsets, None)
+                if next_offset is not None:
+                    window.append(executor.submit(self.fetch_saved_tracks_page, next_offset))
+                yield self.parse_saved_page(page)
+
+    def iter_liked_pages(self, incremental=None):
+        """Yield liked songs page by page as each response arrives.
+
+        With `incremental`, only songs liked since the stored cursor are
+        yielded. Once the source is exhausted the new cursor is staged;
+        commit_liked_cursor() stores it after the songs are downloaded or
+        queued, so an interrupted run fetches them again.
+        """
+        incremental = self.incremental if incremental is None else incremental
+        cursor = self.load_liked_cursor() if incremental else None
+        self.liked_total = None
+        
+        if cursor:
+            print(f"📥 Fetching liked songs added since {cursor['added_at']}...")
+            pages = self.iter_liked_since(cursor)
+        else:
+            print("📥 Fetching your liked songs...")
+            pages = self.iter_all_liked()
+        
+        found = 0
+        newest_page = None
+        for page in pages:
+            newest_page = newest_page or page
+            found += len(page)
+            yield page
+            print(f"📥 Fetched {found}{'/' + str(self.liked_total) if self.liked_total else ''} songs so far...")
+        
+        self.staged_liked_cursor = newest_page
+        print(f"✅ Found {found} {'new ' if cursor else ''}liked songs!")
+
+    def iter_liked_songs(self, incremental=None):
+        """Yield liked songs one TrackRecord at a time"""
+        for page in self.iter_liked_pages(incremental):
+            yield from page
+
+    def iter_source_pages(self, sources=None):
+        """Yield pages from every source (liked songs, playlists, albums,
+        artists); a track reached through several sources is yielded once"""
+        sources = list(sources or self.sources)
+        catalog = SpotifyCatalog(self.spotify, call=self.spotify_call)
+        
+        for index, (kind, source_id) in enumerate(sources):
+            if kind == 'liked':
+                for page in self.iter_liked_pages():
+                    page = catalog.claim(page)
+                    if page:
+                        yield page
+                # The progress total only describes a lone liked-songs source
+                if index < len(sources) - 1:
+                    self.liked_total = None
+                continue
             
-        print(f"✅ Found {len(liked_songs)} liked songs!")
-        return liked_songs
+            print(f"📥 Fetching {kind} {source_id}...")
+            found = 0
+            for page in catalog.iter_pages(kind, source_id):
+                found += len(page)
+                yield page
+            print(f"✅ Found {found} new tracks in {kind} {source_id}")
+        
+        if len(sources) > 1:
+            print(f"📡 {catalog.requests} Spotify requests for {len(catalog.seen)} unique tracks")
+
+    def get_liked_songs(self, incremental=None):
+        """Get liked songs from Spotify as a list (None on failure)"""
+        try:
+            return list(self.iter_liked_songs(incremental))
+        except Exception as e:
+            print(f"❌ Error fetching songs: {e}")
+            return None
         
-    def search_youtube(self, song_info):
-        """Search for song on YouTube with better error handling"""
-        query = f"{song_info['artist']} - {song_info['name']}"
+    def search_youtube(self, song_info, query=None, cache_empty=False):
+        """Search for song on YouTube, serving repeat queries from the search cache.
+
+        `query` defaults to "artist - name"; `cache_empty` also caches a
+        search that found nothing (used for exact ISRC lookups).
+        """
+        query = query or f"{song_info.artist} - {song_info.name}"
+        cache_key = f"ytsearch{self.search_results}:{query}"
         
+        force_refresh = self.refresh_search or song_info.spotify_id in self.fresh_search_ids
+        cached = self.search_cache.get(cache_key, force_refresh=force_refresh)
+        if cached is not None:
+            return cached
+        
+        try:
+            results = self.run_youtube_search(query)
+        except Exception as e:
+            # Errors are not cached so the next run searches again
+            print(f"❌ YouTube search failed for {query}: {e}")
+            return []
+        
+        # Empty fuzzy results are not cached either: they are cheap to confirm
+        if results or cache_empty:
+            self.search_cache.put(cache_key, results)
+        return results
+
+    def search_ydl_options(self):
+        """yt-dlp options for the pooled search instances"""
         # Simplified ydl options to avoid authentication issues and ffmpeg
-        ydl_opts = {
+        return {
             'quiet': True,
             'no_warnings': True,
-            'extract_flat': False,
-            'default_search': 'ytsearch3:',  # Reduced to 3 results for faster processing
+            'extract_flat': 'in_playlist',  # Metadata only - candidates are ranked before any download
+            'default_search': f'ytsearch{self.search_results}:',
             'prefer_ffmpeg': False,  # Disable ffmpeg for search too
             'postprocessors': [],    # No postprocessors
             'extractor_args': {
@@ -152,22 +397,15 @@ class UltimateSpotifyDownloader:
                 }
             }
         }
-        
-        with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-            try:
-                search_results = ydl.extract_info(query, download=False)
-                return search_results['entries'] if search_results else []
-            except Exception as e:
-                print(f"❌ YouTube search failed for {query}: {e}")
-                return []
-                
-    def download_audio_robust(self, video_url, temp_filename):
-        """Download audio with robust error handling and NO ffmpeg usage"""
-        
+
+    def download_ydl_options(self, audio_format):
+        """yt-dlp options for the pooled download instances"""
         # Completely disable ffmpeg to avoid permission issues
-        ydl_opts = {
-            'format': 'bestaudio[ext=m4a]/bestaudio/best',  # Prefer m4a for better compatibility
-            'outtmpl': f"{temp_filename}.%(ext)s",
+        return {
+            'format': audio_format,
+            'outtmpl': os.path.join(self.temp_dir, "%(id)s.%(ext)s"),  # Replaced per download
+            'overwrites': True,      # Never reuse a stale file from an earlier attempt
+            'continuedl': False,     # ...or resume another candidate's .part file
             'quiet': True,
             'no_warnings': True,
             'prefer_ffmpeg': False,  # Explicitly disable ffmpeg
@@ -184,30 +422,61 @@ class UltimateSpotifyDownloader:
             'embed_subs': False,
             'writesubtitles': False
         }
+
+    def run_youtube_search(self, query):
+        """Run a live yt-dlp search on this worker's pooled instance; raises on failure"""
+        with self.ydl_pool.acquire('search', self.search_ydl_options) as ydl:
+            search_results = self.limiters['youtube_search'].call(ydl.extract_info, query, download=False)
         
-        with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-            try:
+        entries = [entry for entry in (search_results or {}).get('entries') or [] if entry]
+        for entry in entries:
+            # Flat results carry 'url' rather than 'webpage_url'
+            entry.setdefault('webpage_url', entry.get('url') or f"https://www.youtube.com/watch?v={entry.get('id')}")
+        return [trim_candidate(entry) for entry in entries]
+                
+    def downloaded_file(self, ydl, info):
+        """Exact (path, bytes) of the file yt-dlp just wrote, from its info dict"""
+        downloads = info.get('requested_downloads') or [info]
+        path = downloads[0].get('filepath') or downloads[0].get('_filename') or ydl.prepare_filename(info)
+        # The format's reported filesize can be approximate; the file is not
+        return path, os.path.getsize(path)
+
+    def download_audio_robust(self, video_url, temp_filename):
+        """Download audio with robust error handling and NO ffmpeg usage.
+
+        Returns (path, bytes) of the downloaded file, or None on failure.
+        """
+        template = f"{temp_filename}.%(ext)s"
+        
+        try:
+            with self.ydl_pool.acquire('download', lambda: self.download_ydl_options(
+                    'bestaudio[ext=m4a]/bestaudio/best')) as ydl:  # Prefer m4a for better compatibility
+                set_output_template(ydl, template)
                 print(f"📥 Downloading from: {video_url}")
-                ydl.download([video_url])
+                info = self.limiters['youtube_media'].call(ydl.extract_info, video_url, download=True)
+                result = self.downloaded_file(ydl, info)
                 print(f"✅ Download completed")
-                return True
-            except Exception as e:
-                print(f"❌ Download failed: {e}")
-                # Try alternative format if first attempt fails
-                try:
-                    print("🔄 Trying alternative format...")
-                    ydl_opts['format'] = 'worst[ext=mp4]/worst'  # Try worst quality as fallback
-                    with yt_dlp.YoutubeDL(ydl_opts) as ydl2:
-                        ydl2.download([video_url])
-                        print(f"✅ Alternative download completed")
-                        return True
-                except Exception as e2:
-                    print(f"❌ Alternative download also failed: {e2}")
-                    return False
+                return result
+        except Exception as e:
+            print(f"❌ Download failed: {e}")
+        
+        # Try alternative format if first attempt fails
+        try:
+            print("🔄 Trying alternative format...")
+            with self.ydl_pool.acquire('download_fallback', lambda: self.download_ydl_options(
+                    'worst[ext=mp4]/worst')) as ydl:  # Try worst quality as fallback
+                set_output_template(ydl, template)
+                info = self.limiters['youtube_media'].call(ydl.extract_info, video_url, download=True)
+                result = self.downloaded_file(ydl, info)
+                print(f"✅ Alternative download completed")
+                return result
+        except Exception as e2:
+            print(f"❌ Alternative download also failed: {e2}")
+            return None
 
     def get_safe_filename(self, song_info):
         """Get safe filename for the song"""
-        filename = f"{song_info['artist']} - {song_info['name']}"
+        filename = f"{song_info.artist} - {song_info.name}"
         # Remove invalid characters
         invalid_chars = '<>:"/\\|?*'
         for char in invalid_chars:
@@ -216,77 +485,37 @@ class UltimateSpotifyDownloader:
         filename = ' '.join(filename.split())
         return filename[:200]  # Limit length
 
-    def download_album_art(self, album_art_url, temp_dir):
-        """Download album artwork from Spotify"""
+    def download_album_art(self, album_art_url, album_id=None):
+        """Get album artwork bytes, fetched at most once per album"""
         if not album_art_url:
             return None
             
         try:
-            # Create a temporary file for the album art
-            temp_art_file = os.path.join(temp_dir, "temp_album_art.jpg")
-            
-            # Download the album art
-            headers = {
-                'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'
-            }
-            response = requests.get(album_art_url, headers=headers, timeout=10)
-            response.raise_for_status()
-            
-            with open(temp_art_file, 'wb') as f:
-                f.write(response.content)
-                
-            print(f"🖼️  Downloaded album artwork")
-            return temp_art_file
-            
+            return self.art_cache.get(album_art_url, key=f"album:{album_id}" if album_id else None)
         except Exception as e:
             print(f"⚠️  Failed to download album art: {e}")
             return None
 
-    def add_metadata_with_artwork(self, audio_file, song_info, temp_dir):
-        """Add metadata including album artwork"""
+    def add_metadata_with_artwork(self, audio_file, song_info):
+        """Write tags and album artwork in the file's own format (ID3, MP4
+        atoms or Vorbis comments); returns False if the file is untagged"""
+        if audio_tagger.backend_for(audio_file) is None:
+            print(f"⚠️  No tagger for {os.path.splitext(audio_file)[1]} files, leaving {song_info.name} untagged")
+            return False
+        album_art = self.download_album_art(song_info.album_art_url, song_info.album_id)
         try:
-            # Try using eyed3 if available
-            import eyed3
-            audiofile = eyed3.load(audio_file)
-            if audiofile and audiofile.tag is None:
-                audiofile.initTag()
-                
-            if audiofile and audiofile.tag:
-                # Add basic metadata
-                audiofile.tag.title = song_info['name']
-                audiofile.tag.artist = song_info['artist']
-                audiofile.tag.album = song_info['album']
-                
-                # Add album artwork
-                album_art_file = None
-                if song_info.get('album_art_url'):
-                    album_art_file = self.download_album_art(song_info['album_art_url'], temp_dir)
-                
-                if album_art_file and os.path.exists(album_art_file):
-                    try:
-                        with open(album_art_file, 'rb') as art_file:
-                            audiofile.tag.images.set(
-                                eyed3.id3.frames.ImageFrame.FRONT_COVER,
-                                art_file.read(),
-                                'image/jpeg'
-                            )
-                        print(f"🖼️  Embedded album artwork")
-                        # Clean up temp art file
-                        os.remove(album_art_file)
-                    except Exception as e:
-                        print(f"⚠️  Failed to embed artwork: {e}")
-                
-                audiofile.tag.save()
-                print(f"✅ Metadata and artwork added to {song_info['name']}")
-            
-        except ImportError:
-            print("⚠️  eyed3 not available, skipping metadata")
-        except Exception as e:
-            print(f"⚠️  Failed to add metadata: {e}")
+            backend = audio_tagger.write_tags(audio_file, song_info.name, song_info.artist, song_info.album,
+                                              isrc=song_info.isrc, cover=album_art)
+        except audio_tagger.TaggingError as e:
+            print(f"⚠️  Failed to tag {song_info.name}: {e}")
+            return False
+        artwork = " and artwork" if album_art else ""
+        print(f"✅ Metadata{artwork} added to {song_info.name} ({backend})")
+        return True
 
     def add_basic_metadata(self, audio_file, song_info):
         """Add basic metadata without complex dependencies - kept for compatibility"""
-        self.add_metadata_with_artwork(audio_file, song_info, self.temp_dir)
+        return self.add_metadata_with_artwork(audio_file, song_info)
     
     def copy_to_custom_folder(self, source_file, song_info):
         """Copy downloaded file to user-selected custom folder"""
@@ -305,203 +534,926 @@ class UltimateSpotifyDownloader:
         except Exception as e:
             print(f"⚠️ Custom folder copy error: {e}")
 
-    def download_song(self, song_info):
-        """Download a single song with robust error handling"""
-        print(f"\n🎵 Downloading: {song_info['artist']} - {song_info['name']}")
+    def link_duplicate(self, song_info, entry):
+        """Record `song_info` as an alias of the manifest `entry` holding the
+        same recording (same ISRC), hardlinking it under its own name if
+        link_duplicates is set"""
+        path = entry['path']
+        if self.link_duplicates:
+            link_path = os.path.join(self.download_dir,
+                                     self.get_safe_filename(song_info) + os.path.splitext(path)[1])
+            if os.path.abspath(link_path) != path and not os.path.exists(link_path):
+                try:
+                    os.link(path, link_path)
+                    path = link_path
+                except OSError as e:
+                    print(f"⚠️  Could not hardlink {link_path}: {e}")
+        self.manifest.record(song_info.spotify_id, path, video_id=entry['video_id'],
+                             isrc=song_info.isrc, alias_of=entry['alias_of'] or entry['spotify_id'])
+        self.retry_queue.resolve(song_info.spotify_id)
+        print(f"🔗 Same recording as an existing download: {song_info.artist} - {song_info.name}")
+
+    def is_downloaded(self, song_info, final_path=None):
+        """Check the manifest (by Spotify ID, then ISRC), adopting
+        pre-manifest MP3s found on disk"""
+        spotify_id = song_info.spotify_id
+        if spotify_id and self.manifest.get(spotify_id):
+            return True
+        if spotify_id and song_info.isrc:
+            entry = self.manifest.by_isrc([song_info.isrc]).get(song_info.isrc)
+            if entry:
+                self.link_duplicate(song_info, entry)
+                return True
+        final_path = final_path or os.path.join(self.download_dir, f"{self.get_safe_filename(song_info)}.mp3")
+        if os.path.exists(final_path):
+            if spotify_id:
+                self.manifest.record(spotify_id, final_path, isrc=song_info.isrc)
+                self.retry_queue.resolve(spotify_id)
+            return True
+        return False
+
+    def rebuild_manifest(self, songs, files_by_stem=None):
+        """Rebuild the manifest by matching files in download_dir to songs"""
+        added = self.manifest.rebuild_from_directory(
+            self.download_dir, songs, self.get_safe_filename, files_by_stem
+        )
+        if added:
+            print(f"🗂️  Recorded {added} existing tracks from {self.download_dir} in the manifest")
+        return added
+
+    def pending_songs(self, songs, files_by_stem=None):
+        """Return the songs that still need downloading (one manifest query);
+        songs already in the library leave the retry queue"""
+        if files_by_stem:
+            self.rebuild_manifest(songs, files_by_stem)
+        missing = set(self.manifest.missing(song.spotify_id for song in songs))
+        pending = [song for song in songs if not song.spotify_id or song.spotify_id in missing]
+        # Downloaded, adopted or linked some other way since they failed
+        present = [song.spotify_id for song in songs if song.spotify_id and song.spotify_id not in missing]
+        if present:
+            self.retry_queue.resolve_many(present)
         
-        # Check if already downloaded
+        # A recording already downloaded for another Spotify ID is reused
+        existing = self.manifest.by_isrc(song.isrc for song in pending if song.spotify_id)
+        if not existing:
+            return pending
+        unique = []
+        for song in pending:
+            entry = existing.get(song.isrc) if song.spotify_id else None
+            if entry:
+                self.link_duplicate(song, entry)
+            else:
+                unique.append(song)
+        return unique
+
+    def hold_duplicates(self, songs, progress):
+        """Let only the first song per ISRC in this run download; later ones
+        become aliases when it succeeds (see resolve_followers)"""
+        unique = []
+        with self._lock:
+            for song in songs:
+                owner = self._isrc_owners.get(song.isrc) if song.isrc and song.spotify_id else None
+                if owner is None or owner == song.spotify_id:
+                    if song.isrc and song.spotify_id:
+                        self._isrc_owners[song.isrc] = song.spotify_id
+                    unique.append(song)
+                else:
+                    self._isrc_followers.setdefault(owner, (progress, []))[1].append(song)
+        return unique
+
+    def iter_pending(self, pages, progress):
+        """Filter a page source down to songs that still need downloading,
+        holding back same-ISRC duplicates (see iter_pending_pages)"""
+        for pending in self.iter_pending_pages(pages, progress):
+            yield from self.hold_duplicates(pending, progress)
+
+    def iter_pending_pages(self, pages, progress):
+        """Yield each page filtered down to songs that still need downloading.
+
+        Skips are counted in `progress`, as are failed songs whose retry is
+        not due yet (progress['deferred']); a source failure ends the stream
+        (already-queued songs still finish) and sets progress['fetch_error'].
+        """
+        # Adopt an existing library the first time the manifest is used
+        files_by_stem = None
+        if self.manifest.count() == 0:
+            files_by_stem = self.manifest.scan_directory(self.download_dir)
+        
+        try:
+            for page in pages:
+                progress['seen'] += len(page)
+                pending = self.pending_songs(page, files_by_stem)
+                progress['skipped'] += len(page) - len(pending)
+                blocked = self.retry_queue.blocked([song.spotify_id for song in pending])
+                if blocked:
+                    pending = [song for song in pending if song.spotify_id not in blocked]
+                    progress['deferred'] += len(blocked)
+                yield pending
+        except Exception as e:
+            print(f"❌ Error fetching songs: {e}")
+            progress['fetch_error'] = e
+
+    def progress_label(self, progress, current=0):
+        """'[done/total]' where total is '?' until the source reports it;
+        `current` counts tracks that are being worked on right now"""
+        done = (progress['successful'] + progress['failed'] + progress['skipped']
+                + progress['deferred'] + progress['duplicates'] + current)
+        label = f"[{done}/{self.liked_total or '?'}]"
+        # Surface any upstream that is currently backing off
+        paused = [limiter.describe() for limiter in self.limiters.values() if limiter.cooldown_remaining() > 0]
+        if paused:
+            label += f" ⏳ {', '.join(paused)}"
+        return label
+
+    def add_failed_song(self, song_info):
+        """Record a failed song (safe to call from any worker thread)"""
+        with self._lock:
+            self.failed_songs.append(song_info)
+
+    def fail_job(self, job, reason):
+        """Mark a job as failed with a short reason (e.g. 'no_match')"""
+        job.error = reason
+        self.add_failed_song(job.song_info)
+
+    def create_job(self, song_info):
+        """Build the per-track state used by the download stages"""
+        song_info = TrackRecord.coerce(song_info)
         safe_filename = self.get_safe_filename(song_info)
         final_path = os.path.join(self.download_dir, f"{safe_filename}.mp3")
+        # Temp names carry the Spotify ID so parallel workers never collide
+        temp_file = os.path.join(self.temp_dir, f"temp_{song_info.spotify_id or safe_filename}")
+        return DownloadJob(song_info, safe_filename, final_path, temp_file)
+
+    def search_stage(self, job):
+        """Stage 1: skip existing files and search YouTube for candidates"""
+        song_info = job.song_info
+        print(f"\n🎵 Downloading: {song_info.artist} - {song_info.name}")
         
-        if os.path.exists(final_path):
-            print(f"⏭️  Already downloaded: {song_info['name']}")
-            return True
+        # Check if already downloaded
+        if self.is_downloaded(song_info, job.final_path):
+            print(f"⏭️  Already downloaded: {song_info.name}")
+            job.ok = True
+            return False
             
+        # The ISRC pins the exact recording; fall back to a fuzzy search
+        if self.isrc_search and song_info.isrc:
+            results = self.search_youtube(song_info, query=f'"{song_info.isrc}"', cache_empty=True)
+            ranked = rank_candidates(song_info, results, self.match_threshold)
+            if ranked:
+                job.candidates = [candidate for _, candidate in ranked]
+                print(f"🔖 Matched by ISRC {song_info.isrc} (best score {ranked[0][0]:.2f})")
+                return True
+        
         # Search YouTube
-        youtube_results = self.search_youtube(song_info)
-        if not youtube_results:
-            print(f"❌ No YouTube results found for {song_info['name']}")
-            self.failed_songs.append(song_info)
+        results = self.search_youtube(song_info)
+        if not results:
+            print(f"❌ No YouTube results found for {song_info.name}")
+            self.fail_job(job, 'no_results')
             return False
-            
+        
+        # Rank on metadata so wrong videos are never downloaded
+        ranked = rank_candidates(song_info, results, self.match_threshold)
+        if not ranked:
+            print(f"❌ No YouTube result matched {song_info.name} closely enough ({len(results)} rejected)")
+            self.fail_job(job, 'no_match')
+            return False
+        job.candidates = [candidate for _, candidate in ranked]
+        print(f"🎯 {len(ranked)}/{len(results)} results passed matching (best score {ranked[0][0]:.2f})")
+        return True
+
+    def download_stage(self, job):
+        """Stage 2: try each YouTube candidate until one yields an audio file"""
+        temp_file = job.temp_file
+        
         # Try each YouTube result
-        for i, video in enumerate(youtube_results):
-            print(f"🔄 Trying result {i+1}/{len(youtube_results)}: {video.get('title', 'Unknown')}")
-            
-            temp_file = os.path.join(self.temp_dir, f"temp_{safe_filename}")
+        for i, video in enumerate(job.candidates):
+            print(f"🔄 Trying result {i+1}/{len(job.candidates)}: {video.get('title', 'Unknown')}")
             
-            # Download audio
-            if not self.download_audio_robust(video['webpage_url'], temp_file):
+            # Download audio; yt-dlp reports exactly what it wrote
+            downloaded = self.download_audio_robust(video['webpage_url'], temp_file)
+            if not downloaded:
                 continue
             
-            # Wait for download to complete
-            print("⏳ Waiting for download to complete...")
-            time.sleep(3)
-                
-            # Find the downloaded file
-            possible_files = [
-                f"{temp_file}.mp3",
-                f"{temp_file}.m4a", 
-                f"{temp_file}.webm",
-                f"{temp_file}.opus",
-                f"{temp_file}.mp4"
-            ]
+            temp_audio, size = downloaded
+            if size < 10000:  # At least 10KB
+                print(f"❌ Downloaded file is too small: {temp_audio} ({size} bytes)")
+                try:
+                    os.remove(temp_audio)
+                except OSError:
+                    pass
+                continue
+            print(f"📁 Downloaded file: {temp_audio} ({size} bytes)")
             
-            temp_audio = None
-            for possible_file in possible_files:
-                if os.path.exists(possible_file) and os.path.getsize(possible_file) > 10000:  # At least 10KB
-                    temp_audio = possible_file
-                    print(f"📁 Found downloaded file: {temp_audio} ({os.path.getsize(possible_file)} bytes)")
-                    break
+            job.temp_audio = temp_audio
+            job.video = video
+            job.stage_bytes = size
+            return True
             
-            # Clean up any downloaded thumbnail files
-            possible_thumbnails = [
-                f"{temp_file}.jpg",
-                f"{temp_file}.jpeg", 
-                f"{temp_file}.png",
-                f"{temp_file}.webp"
-            ]
-            for thumb_file in possible_thumbnails:
-                if os.path.exists(thumb_file):
+        print(f"❌ Could not download: {job.song_info.name}")
+        self.fail_job(job, 'download_failed')
+        return False
+
+    def uses_local_converter(self):
+        """Whether conversions (or remuxes) run in the local ffmpeg pool"""
+        if self.converter == 'none':
+            return False
+        if self.remux_only or self.converter == 'local':
+            return True
+        return self.converter == 'auto' and self.local_converter.available()
+
+    def check_converter(self):
+        """False (after saying why) when the requested local conversion
+        cannot run, instead of quietly keeping every download as is"""
+        if self.converter == 'none' or not (self.remux_only or self.converter == 'local'):
+            return True
+        if self.local_converter.available():
+            return True
+        option = "--remux-only" if self.remux_only else "--converter local"
+        print(f"❌ {option} needs FFmpeg, but it is not on PATH (set FFMPEG_PATH to its location)")
+        return False
+
+    def describe_converter(self):
+        if self.converter == 'none':
+            return "keeping the downloaded format"
+        if self.remux_only:
+            return f"remux to audio-only containers, no re-encoding (local FFmpeg: {self.local_converter.available()})"
+        if self.uses_local_converter():
+            return f"local FFmpeg pool ({self.local_converter.max_jobs} jobs)"
+        cloud = cloud_converter()
+        return f"cloud server (available: {bool(cloud and cloud.is_cloud_audio_available())})"
+
+    def convert_with_android_ffmpeg(self, input_path, output_path):
+        """Convert through the Android app's FFmpeg (UiBridge)"""
+        try:
+            from java import jclass
+            UiBridge = jclass("org.example.spotifydownloader.UiBridge")
+            return bool(UiBridge.convertAudioToMp3(input_path, output_path))
+        except Exception as e:
+            print(f"❌ Local FFmpeg fallback error: {e}")
+            return False
+
+    def conversion_methods(self):
+        """Ordered (label, convert(input, output)) pairs for the configured converter"""
+        local = ('local FFmpeg', self.local_converter.convert_to_mp3)
+        android = ('Android FFmpeg', self.convert_with_android_ffmpeg)
+        if self.converter == 'local':
+            return [local]
+        methods = [local] if self.converter == 'auto' and self.local_converter.available() else []
+        cloud = cloud_converter()
+        if cloud and cloud.is_cloud_audio_available():
+            methods.append(('cloud', cloud.convert_audio_to_mp3_cloud))
+        return methods + [android]
+
+    def keep_native(self, job):
+        """Store the download in its original format"""
+        job.final_path = os.path.splitext(job.final_path)[0] + os.path.splitext(job.temp_audio)[1]
+        return True
+
+    def convert_stage(self, job):
+        """Stage 3: convert (or remux) the download per the converter
+        settings, keeping the original format on failure"""
+        temp_audio = job.temp_audio
+        if self.converter == 'none':
+            return self.keep_native(job)
+        
+        if self.remux_only:
+            extension = remux_extension(temp_audio)
+            if extension:
+                remuxed = f"{job.temp_file}_remuxed{extension}"
+                if self.local_converter.remux(temp_audio, remuxed):
                     try:
-                        os.remove(thumb_file)
-                    except:
+                        os.remove(temp_audio)
+                    except OSError:
                         pass
+                    job.temp_audio = remuxed
+                    job.stage_bytes = os.path.getsize(remuxed)
+            return self.keep_native(job)
+        
+        if temp_audio.endswith('.mp3'):
+            return True
             
-            if not temp_audio:
-                print(f"❌ No downloaded file found")
-                continue
-                
-            # Move to final location
-            try:
-                # If the downloaded file is not MP3, convert it using cloud server
-                if not temp_audio.endswith('.mp3'):
-                    print(f"🌐 Converting {temp_audio} to MP3 via cloud server...")
-                    mp3_temp = f"{temp_file}_converted.mp3"
-                    
-                    # Try cloud conversion first
-                    conversion_success = False
-                    if CLOUD_CONVERTER_AVAILABLE and is_cloud_audio_available() and convert_audio_to_mp3_cloud(temp_audio, mp3_temp):
-                        print("✅ Successfully converted to MP3 via cloud")
-                        conversion_success = True
-                    else:
-                        print("⚠️ Cloud conversion failed, trying local FFmpeg...")
-                        # Try local FFmpeg as fallback
-                        try:
-                            from java import jclass
-                            UiBridge = jclass("org.example.spotifydownloader.UiBridge")
-                            
-                            # Use Android FFmpeg via UiBridge
-                            success = UiBridge.convertAudioToMp3(temp_audio, mp3_temp)
-                            if success:
-                                print("✅ Successfully converted to MP3 via local FFmpeg")
-                                conversion_success = True
-                            else:
-                                print("❌ Local FFmpeg conversion also failed")
-                        except Exception as e:
-                            print(f"❌ Local FFmpeg fallback error: {e}")
-                    
-                    if conversion_success:
-                        # Remove original file and use converted MP3
-                        try:
-                            os.remove(temp_audio)
-                        except:
-                            pass
-                        temp_audio = mp3_temp
-                    else:
-                        print("⚠️ All conversion methods failed, keeping original format")
-                        # Update final path to match original format
-                        final_path = final_path.replace('.mp3', os.path.splitext(temp_audio)[1])
-                
-                os.rename(temp_audio, final_path)
-                print(f"📁 Moved to: {final_path}")
-                
-                # Add basic metadata
-                self.add_basic_metadata(final_path, song_info)
-                
-                # Copy to custom folder if specified
-                if self.custom_output_uri:
-                    self.copy_to_custom_folder(final_path, song_info)
-                
-                print(f"✅ Successfully downloaded: {song_info['name']}")
+        mp3_temp = f"{job.temp_file}_converted.mp3"
+        for label, convert in self.conversion_methods():
+            print(f"🎛️  Converting {temp_audio} to MP3 via {label}...")
+            if convert(temp_audio, mp3_temp):
+                print(f"✅ Successfully converted to MP3 via {label}")
+                # Remove original file and use converted MP3
+                try:
+                    os.remove(temp_audio)
+                except OSError:
+                    pass
+                job.temp_audio = mp3_temp
+                job.stage_bytes = os.path.getsize(mp3_temp)
                 return True
-                
-            except Exception as e:
-                print(f"❌ Failed to move file: {e}")
-                continue
-                
-        print(f"❌ Could not download: {song_info['name']}")
-        self.failed_songs.append(song_info)
-        return False
+            print(f"⚠️ Conversion via {label} failed")
+        
+        print("⚠️ All conversion methods failed, keeping original format")
+        return self.keep_native(job)
+
+    def tag_stage(self, job):
+        """Stage 4: tag the temp file, move it into the library and copy it
+        to the custom folder"""
+        song_info = job.song_info
+        # Tag before the move, so the library file is complete once it appears
+        with self.metrics.stage(song_info, 'tag.metadata'):
+            if not self.add_basic_metadata(job.temp_audio, song_info):
+                with self._lock:
+                    self.untagged += 1
+        
+        try:
+            os.replace(job.temp_audio, job.final_path)
+            print(f"📁 Moved to: {job.final_path}")
+        except Exception as e:
+            print(f"❌ Failed to move file: {e}")
+            print(f"❌ Could not download: {song_info.name}")
+            self.fail_job(job, 'move_failed')
+            return False
+        
+        # Copy to custom folder if specified
+        if self.custom_output_uri:
+            with self.metrics.stage(song_info, 'tag.custom_copy'):
+                self.copy_to_custom_folder(job.final_path, song_info)
+        
+        self.manifest.record(
+            song_info.spotify_id or job.safe_filename,
+            job.final_path,
+            video_id=job.video.get('id') if job.video else None,
+            isrc=song_info.isrc,
+        )
+        print(f"✅ Successfully downloaded: {song_info.name}")
+        job.ok = True
+        return True
+
+    def download_stages(self):
+        """Ordered (name, stage) pairs making up a single track download"""
+        return [
+            ('search', self.search_stage),
+            ('download', self.download_stage),
+            ('convert', self.convert_stage),
+            ('tag', self.tag_stage),
+        ]
+
+    def run_stage(self, name, stage, job):
+        """Run one stage for `job`, recording its time and output bytes"""
+        if self.lease_keeper is not None and not self.lease_keeper.holds(job.song_info.spotify_id):
+            # Our lease expired and another worker has the track now
+            job.error = LEASE_LOST
+            return False
+        with self.metrics.stage(job.song_info, name) as timing:
+            job.stage_bytes = 0
+            try:
+                return stage(job)
+            finally:
+                timing.bytes = job.stage_bytes
+
+    def finish_job(self, job, error=None):
+        """Record the track's outcome once its last stage has run"""
+        ok = job.ok and error is None
+        reason = job.error or (type(error).__name__ if error is not None else None)
+        self.metrics.track_finished(job.song_info, ok, reason, time.perf_counter() - job.started)
+        if ok:
+            self.retry_queue.resolve(job.song_info.spotify_id)
+        self.resolve_followers(job.song_info, ok, reason)
+        if ok or reason == LEASE_LOST:
+            return
+        entry = self.retry_queue.record_failure(
+            job.song_info, reason or 'unknown', str(error) if error is not None else None
+        )
+        if entry and entry['gave_up']:
+            print(f"🪦 Giving up on {job.song_info.name} after {entry['attempts']} attempts ({entry['error_class']})")
+
+    def resolve_followers(self, song_info, ok, reason):
+        """Link the same-ISRC songs held back for `song_info` to its download,
+        or queue them for a retry of their own when it failed, so each one
+        ends up in the manifest or the retry queue"""
+        with self._lock:
+            progress, followers = self._isrc_followers.pop(song_info.spotify_id, (None, []))
+        if not followers:
+            return
+        entry = self.manifest.get(song_info.spotify_id) if ok else None
+        if entry:
+            for song in followers:
+                self.link_duplicate(song, entry)
+            with self._lock:
+                progress['duplicates'] += len(followers)
+            return
+        if reason == LEASE_LOST:
+            # Still leased to us; settle_leases hands them back to the queue
+            return
+        for song in followers:
+            self.retry_queue.record_failure(song, 'duplicate_of_failed',
+                                            f"{song_info.spotify_id} failed: {reason or 'unknown'}")
+        with self._lock:
+            progress['deferred'] += len(followers)
+        print(f"⏸️  {len(followers)} tracks with the same recording as {song_info.name} will be retried")
+
+    def download_song(self, song_info):
+        """Download a single song (TrackRecord or song_info dict) with robust error handling"""
+        job = self.create_job(song_info)
+        try:
+            for name, stage in self.download_stages():
+                if not self.run_stage(name, stage, job):
+                    break
+        except Exception as e:
+            self.finish_job(job, e)
+            raise
+        self.finish_job(job)
+        return job.ok
 
     def save_failed_songs(self):
         """Save list of failed songs for retry"""
         if self.failed_songs:
             failed_file = "failed_downloads.json"
             with open(failed_file, 'w') as f:
-                json.dump(self.failed_songs, f, indent=2)
+                json.dump([TrackRecord.coerce(song).to_dict() for song in self.failed_songs], f, indent=2)
             print(f"💾 Failed songs saved to: {failed_file}")
 
-    def download_all(self):
-        """Download all liked songs"""
-        print("🚀 Starting Ultimate Spotify Downloader\n")
-        
-        # Setup
-        if not self.setup_spotify_auth():
-            return
-            
-        liked_songs = self.get_liked_songs()
-        
-        if not liked_songs:
-            print("❌ No liked songs found!")
+    def save_run_report(self, progress):
+        """Write the per-stage timing report next to failed_downloads.json"""
+        self.metrics.skipped = progress['skipped']
+        try:
+            report = self.metrics.write_report(self.report_file)
+        except OSError as e:
+            print(f"⚠️  Could not write run report: {e}")
             return
-            
-        print(f"\n📥 Starting download of {len(liked_songs)} songs...")
-        print("🔧 Using robust mode - no fingerprinting, no video clips")
-        print(f"🌐 Cloud converter available for M4A→MP3 conversion: {is_cloud_audio_available()}")
+        if report['stages']:
+            print("⏱️  Stage timings (p50 / p95):")
+            for name, stage in report['stages'].items():
+                print(f"   {name:<16} {stage['p50_seconds']:.2f}s / {stage['p95_seconds']:.2f}s")
+        print(f"📊 Run report saved to: {self.report_file}")
+
+    def download_serial(self, songs, progress):
+        """Download songs one at a time, updating `progress` counters"""
+        try:
+            for song in songs:
+                print(f"\n{self.progress_label(progress, current=1)}", end=" ")
+                
+                try:
+                    if self.download_song(song):
+                        progress['successful'] += 1
+                    else:
+                        progress['failed'] += 1
+                except Exception as e:
+                    print(f"❌ Unexpected error: {e}")
+                    progress['failed'] += 1
+                    self.add_failed_song(song)
+        except KeyboardInterrupt:
+            progress['interrupted'] = True
+            print("\n⏹️  Download interrupted by user")
+
+    def download_pipelined(self, songs, workers, progress):
+        """Download songs through concurrent search/download/convert/tag
+        stages connected by bounded queues, updating `progress` counters"""
+        def on_done(job, error):
+            if error is not None:
+                print(f"❌ Unexpected error: {error}")
+                self.add_failed_song(job.song_info)
+            self.finish_job(job, error)
+            with self._lock:
+                key = 'successful' if job.ok and error is None else 'failed'
+                progress[key] += 1
+                label = self.progress_label(progress)
+            status = "✅" if key == 'successful' else "❌"
+            print(f"{label} {status} {job.song_info.name}")
         
-        successful = 0
-        failed = 0
+        stages = [PipelineStage(name, functools.partial(self.run_stage, name, stage),
+                                self.stage_workers(name, workers))
+                  for name, stage in self.download_stages()]
+        pipeline = DownloadPipeline(stages, queue_size=self.queue_size, on_done=on_done)
         
-        for i, song in enumerate(liked_songs, 1):
-            print(f"\n[{i}/{len(liked_songs)}]", end=" ")
-            
+        try:
+            pipeline.run(self.create_job(song) for song in songs)
+        except KeyboardInterrupt:
+            progress['interrupted'] = True
+            print("\n⏹️  Download interrupted by user - finishing in-flight tracks...")
+            pipeline.stop()
             try:
-                if self.download_song(song):
-                    successful += 1
-                else:
-                    failed += 1
+                pipeline.join()
             except KeyboardInterrupt:
-                print("\n⏹️  Download interrupted by user")
-                break
-            except Exception as e:
-                print(f"❌ Unexpected error: {e}")
-                failed += 1
-                self.failed_songs.append(song)
-                
-            # Small delay to be nice to APIs
-            time.sleep(2)
-            
+                pass
+
+    def new_progress(self):
+        """Counters shared by the download drivers and the summary"""
+        return {'seen': 0, 'successful': 0, 'failed': 0, 'skipped': 0, 'deferred': 0,
+                'duplicates': 0, 'fetch_error': None, 'interrupted': False}
+
+    def stage_workers(self, name, workers):
+        """Threads for one pipeline stage: local conversions get one per CPU"""
+        if name == 'convert' and self.uses_local_converter():
+            return max(workers, self.local_converter.max_jobs)
+        return workers
+
+    def run_downloads(self, pending, workers, progress):
+        """Download `pending` songs serially or through the pipeline"""
+        self.metrics = RunMetrics(self.metrics_hooks)
+        self._isrc_owners, self._isrc_followers = {}, {}
+        self.untagged = 0
+        # Local conversions always run as their own stage, overlapping downloads
+        if workers > 1 or self.uses_local_converter():
+            print(f"⚡ Pipelined mode with {workers} workers per stage, "
+                  f"{self.stage_workers('convert', workers)} for conversion")
+            self.download_pipelined(pending, workers, progress)
+        else:
+            self.download_serial(pending, progress)
+        self.ydl_pool.close_all()
+
+    def print_summary(self, progress):
+        """Print run statistics and save the failed list and run report"""
         print(f"\n🎉 Download complete!")
-        print(f"✅ Successful: {successful}")
-        print(f"❌ Failed: {failed}")
+        print(f"✅ Successful: {progress['successful']}")
+        print(f"⏭️  Already downloaded: {progress['skipped']}")
+        if progress['deferred']:
+            print(f"⏸️  Waiting to retry: {progress['deferred']}")
+        if progress['duplicates']:
+            print(f"🔗 Same recording as another track: {progress['duplicates']}")
+        print(f"❌ Failed: {progress['failed']}")
+        if self.untagged:
+            print(f"🏷️  Saved without tags: {self.untagged}")
+        search_stats = self.search_cache.stats()
+        print(f"🔎 Search cache: {search_stats['hits']} hits, {search_stats['misses']} misses")
+        print(f"🧰 YoutubeDL instances built: {self.ydl_pool.created}")
+        art_stats = self.art_cache.stats()
+        print(f"🖼️  Album art cache: {art_stats['hits']} hits, {art_stats['misses']} downloads")
+        print(f"🚦 Rate limits: {', '.join(limiter.describe() + f' ({limiter.throttled} throttled)' for limiter in self.limiters.values())}")
+        retry_stats = self.retry_queue.stats()
+        print(f"🔁 Retry queue: {retry_stats['due']} due, {retry_stats['waiting']} waiting, "
+              f"{retry_stats['given_up']} given up")
         print(f"📁 Files saved to: {os.path.abspath(self.download_dir)}")
         
         # Save failed songs for retry
         self.save_failed_songs()
+        self.save_run_report(progress)
+        
+        if progress['fetch_error'] is not None:
+            print(f"\n⚠️  The liked songs list could not be fully fetched - run again to pick up the rest")
+        if progress['failed'] > 0:
+            print(f"\n🔄 Failed downloads are queued for retry with backoff")
+            print(f"   Run with --retry-failed to process the ones that are due")
+
+    def download_all(self, workers=None):
+        """Download all songs from the configured sources (liked songs by
+        default), starting as soon as the first page arrives"""
+        print("🚀 Starting Ultimate Spotify Downloader\n")
+        workers = max(1, int(workers or self.workers))
+        if not self.check_converter():
+            return
+        
+        # Setup (skipped when a client was injected, e.g. by the benchmarks)
+        if self.spotify is None and not self.setup_spotify_auth():
+            return
+        self.setup_directories()
+            
+        print("🔧 Using robust mode - no fingerprinting, no video clips")
+        print(f"🎛️  Conversion: {self.describe_converter()}")
+        
+        progress = self.new_progress()
+        self.run_downloads(self.iter_pending(self.iter_source_pages(), progress), workers, progress)
+        # Every fetched song now has a manifest entry or a retry queue
+        # entry; after an interruption some have neither, so keep the cursor
+        if not progress['interrupted']:
+            self.commit_liked_cursor()
+        
+        if progress['fetch_error'] is None and progress['seen'] == 0:
+            if self.sources != [('liked', None)]:
+                print("✅ No new songs to download" if self.incremental else "❌ No songs found in the selected sources!")
+            else:
+                print("✅ No new liked songs to download" if self.incremental else "❌ No liked songs found!")
+            return
+        self.print_summary(progress)
+
+    def retry_failed(self, workers=None):
+        """Retry only the failed songs whose backoff has elapsed (no Spotify access needed)"""
+        print("🔁 Retrying failed downloads\n")
+        workers = max(1, int(workers or self.workers))
+        if not self.check_converter():
+            return
+        
+        entries = self.retry_queue.due()
+        if not entries:
+            stats = self.retry_queue.stats()
+            print(f"✅ No failed songs are due for a retry "
+                  f"({stats['waiting']} waiting, {stats['given_up']} given up)")
+            return
+        
+        print(f"📋 {len(entries)} failed songs are due for a retry")
+        songs = [TrackRecord.coerce(entry['track']) for entry in entries]
+        self.liked_total = len(songs)
+        # The cached search is what failed for these; search again
+        self.fresh_search_ids = {entry['spotify_id'] for entry in entries
+                                 if entry['error_class'] in SEARCH_ERRORS}
+        
+        progress = self.new_progress()
+        self.run_downloads(self.iter_pending([songs], progress), workers, progress)
+        self.fresh_search_ids = set()
+        self.print_summary(progress)
+
+    def work_queue_path(self, queue_path=None):
+        return queue_path or os.path.join(self.download_dir, ".work_queue.db")
+
+    def coordinate(self, queue_path=None, wait=False, poll=5):
+        """Queue the pending songs from the configured sources for `work`
+        processes instead of downloading them here"""
+        print("🗂️  Coordinating a sharded sync\n")
+        self.shared_stores = True
+        if self.spotify is None and not self.setup_spotify_auth():
+            return
+        self.setup_directories()
+        
+        queue_path = self.work_queue_path(queue_path)
+        work_queue = WorkQueue(queue_path)
+        progress = self.new_progress()
+        queued = 0
+        for pending in self.iter_pending_pages(self.iter_source_pages(), progress):
+            queued += work_queue.enqueue(pending)
+        # The queue now holds every new song
+        self.commit_liked_cursor()
+        
+        stats = work_queue.stats()
+        print(f"📬 Queued {queued} songs ({progress['skipped']} already downloaded, "
+              f"{progress['deferred']} waiting to retry); {stats['pending']} pending, "
+              f"{stats['leased']} being downloaded")
+        if progress['fetch_error'] is not None:
+            print("⚠️  The sources could not be fully fetched - run again to queue the rest")
+        print(f"👷 Start workers with: python {os.path.basename(__file__)} work --queue {queue_path}")
+        if wait:
+            self.wait_for_workers(work_queue, poll)
+
+    def wait_for_workers(self, work_queue, poll=5):
+        """Report queue progress until every queued song has a result"""
+        last = None
+        while True:
+            reclaimed = work_queue.reclaim_expired()
+            if reclaimed:
+                print(f"♻️  Reclaimed {reclaimed} songs from workers whose lease expired")
+            stats = work_queue.stats()
+            line = (f"📊 {stats['pending']} pending, {stats['leased']} leased to {stats['workers']} workers, "
+                    f"{stats['done']} done, {stats['failed']} failed")
+            if line != last:
+                print(line)
+                last = line
+            if not stats['pending'] and not stats['leased']:
+                return stats
+            time.sleep(poll)
+
+    def iter_claimed_pages(self, work_queue, batch, follow=False, poll=5):
+        """Yield pages of songs leased from the work queue until nothing is
+        left to claim (or forever with `follow`)"""
+        keeper = self.lease_keeper
+        while True:
+            self.settle_leases(keeper, final=False)
+            entries = work_queue.claim(keeper.worker_id, batch, keeper.lease_seconds)
+            if entries:
+                keeper.add(entry['spotify_id'] for entry in entries)
+                yield [TrackRecord.coerce(entry['track']) for entry in entries]
+                continue
+            # Wait while other workers hold leases: they may expire and come back
+            stats = work_queue.stats(worker=keeper.worker_id)
+            if not follow and not stats['pending'] and not stats['leased_elsewhere']:
+                return
+            time.sleep(poll)
+
+    def run_worker(self, queue_path=None, worker_id=None, batch=None,
+                   lease_seconds=DEFAULT_LEASE_SECONDS, follow=False, poll=5, workers=None):
+        """Download songs leased from a coordinator's work queue (no Spotify
+        access needed), committing each result as it finishes"""
+        workers = max(1, int(workers or self.workers))
+        if not self.check_converter():
+            return
+        worker_id = worker_id or f"{socket.gethostname()}-{os.getpid()}"
+        queue_path = self.work_queue_path(queue_path)
+        if not os.path.exists(queue_path):
+            print(f"❌ No work queue at {queue_path} - run 'coordinate' first")
+            return
+        print(f"👷 Worker {worker_id} taking songs from {queue_path}\n")
+        self.shared_stores = True
+        self.setup_directories()
+        
+        work_queue = WorkQueue(queue_path, lease_seconds=lease_seconds)
+        self.lease_keeper = LeaseKeeper(work_queue, worker_id, lease_seconds).start()
+        hook = WorkQueueHook(self.lease_keeper)
+        self.metrics_hooks.append(hook)
+        progress = self.new_progress()
+        try:
+            pages = self.iter_claimed_pages(work_queue, batch or 2 * workers, follow, poll)
+            self.run_downloads(self.iter_pending(pages, progress), workers, progress)
+        finally:
+            self.settle_leases(self.lease_keeper)
+            self.lease_keeper.stop()
+            self.lease_keeper = None
+            self.metrics_hooks.remove(hook)
+        self.print_summary(progress)
+
+    def settle_leases(self, keeper, final=True):
+        """Resolve leased songs that never reached the download stages:
+        already downloaded (or linked as duplicates) ones are done. At the
+        end of the run, deferred ones fail and anything left unfinished by
+        an interruption goes back to the queue."""
+        held = keeper.held()
+        if not held:
+            return
+        blocked = self.retry_queue.blocked(held) if final else set()
+        unfinished = []
+        for spotify_id in held:
+            if self.manifest.get(spotify_id):
+                keeper.commit(spotify_id, True)
+            elif not final:
+                continue
+            elif spotify_id in blocked:
+                keeper.commit(spotify_id, False, 'deferred')
+            else:
+                unfinished.append(spotify_id)
+        if unfinished:
+            keeper.release(unfinished)
+            print(f"↩️  Returned {len(unfinished)} unfinished songs to the work queue")
+
+    def store_exists(self, name):
+        """Whether the store file `name` exists in the download folder"""
+        return os.path.exists(os.path.join(self.download_dir, name))
+
+    def print_status(self):
+        """Summarize the library, retry queue and last run from local state
+        only; nothing is created if no sync has run yet"""
+        print(f"📁 Library: {os.path.abspath(self.download_dir)}")
+        if not self.store_exists(".library_manifest.db"):
+            print("📭 Nothing downloaded yet - run 'sync' first")
+            return
+        
+        summary = self.manifest.summary()
+        formats = ', '.join(f"{count} {fmt}" for fmt, count in summary['formats'].items())
+        print(f"🎵 Tracks: {summary['tracks']} ({formats or 'no files'}), "
+              f"{summary['bytes'] / (1024 * 1024):.1f} MB")
+        if summary['aliases']:
+            print(f"🔗 Same recording as another track: {summary['aliases']}")
+        cursor = self.load_liked_cursor()
+        if cursor:
+            print(f"🕒 Newest synced liked song added: {cursor['added_at']}")
+        
+        if self.store_exists(".retry_queue.db"):
+            retry_stats = self.retry_queue.stats()
+            print(f"🔁 Retry queue: {retry_stats['due']} due, {retry_stats['waiting']} waiting, "
+                  f"{retry_stats['given_up']} given up")
+        if self.store_exists(".work_queue.db"):
+            work_stats = WorkQueue(self.work_queue_path()).stats()
+            print(f"👷 Work queue: {work_stats['pending']} pending, {work_stats['leased']} leased to "
+                  f"{work_stats['workers']} workers ({work_stats['expired']} expired), "
+                  f"{work_stats['done']} done, {work_stats['failed']} failed")
+        
+        try:
+            with open(self.report_file) as f:
+                report = json.load(f)
+        except (OSError, ValueError):
+            return
+        tracks = report.get('tracks', {})
+        print(f"📊 Last run: {report.get('finished_at', 'unknown')} - {tracks.get('successful', 0)} downloaded, "
+              f"{tracks.get('failed', 0)} failed, {tracks.get('skipped', 0)} already downloaded")
+
+    def verify_library(self, fix=False):
+        """Check every manifest entry against its file on disk. With `fix`,
+        entries whose file is gone are dropped so the next sync downloads
+        them again. Returns the number of missing files."""
+        if not self.store_exists(".library_manifest.db"):
+            print("📭 Nothing downloaded yet - run 'sync' first")
+            return 0
+        
+        print(f"🔍 Verifying {os.path.abspath(self.download_dir)}...")
+        missing, present, changed = [], 0, 0
+        tracked = set()
+        for entry in self.manifest.entries():
+            tracked.add(os.path.normcase(entry['path']))
+            try:
+                size = os.path.getsize(entry['path'])
+            except OSError:
+                missing.append(entry)
+                continue
+            present += 1
+            if entry['size'] is not None and size != entry['size']:
+                changed += 1
+        untracked = sum(1 for entry in LibraryManifest.scan_directory(self.download_dir).values()
+                        if os.path.normcase(os.path.abspath(entry.path)) not in tracked)
+        
+        for entry in missing[:20]:
+            print(f"❌ Missing: {entry['path']}")
+        if len(missing) > 20:
+            print(f"   ... and {len(missing) - 20} more")
+        print(f"✅ {present} tracks present, {len(missing)} missing, "
+              f"{changed} changed size since download, {untracked} audio files not in the manifest")
         
-        if failed > 0:
-            print(f"\n🔄 To retry failed downloads, run the script again")
-            print(f"   Failed songs are saved in failed_downloads.json")
+        if missing and fix:
+            for entry in missing:
+                self.manifest.remove(entry['spotify_id'])
+            print(f"🧹 Forgot {len(missing)} missing tracks; the next sync downloads them again")
+        elif missing:
+            print("   Run 'verify --fix' to download them again on the next sync")
+        return len(missing)
+
+COMMANDS = ('sync', 'status', 'retry-failed', 'verify', 'coordinate', 'work')
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Download your Spotify liked songs, playlists, albums and artists")
+    commands = parser.add_subparsers(dest='command', metavar='COMMAND')
+    
+    # Options shared by the commands that download
+    download_options = argparse.ArgumentParser(add_help=False)
+    download_options.add_argument('--workers', type=int, default=1,
+                                  help="Parallel workers per stage (1 = one track at a time)")
+    download_options.add_argument('--refresh-search', action='store_true',
+                                  help="Ignore cached YouTube searches and search again")
+    download_options.add_argument('--link-duplicates', action='store_true',
+                                  help="Hardlink tracks that share a recording (ISRC) under each track's own name")
+    download_options.add_argument('--converter', choices=['auto', 'local', 'cloud', 'none'], default='auto',
+                                  help="How to convert non-MP3 downloads: local FFmpeg pool, cloud server, "
+                                       "or none to keep the downloaded format (auto: local if FFmpeg is installed)")
+    download_options.add_argument('--remux-only', action='store_true',
+                                  help="Never re-encode; only move the audio into an audio-only container "
+                                       "(needs FFmpeg)")
+    
+    # Options shared by the commands that read Spotify sources
+    source_options = argparse.ArgumentParser(add_help=False)
+    source_options.add_argument('--source', action='append', dest='sources', metavar='SOURCE',
+                                help="'liked' or a Spotify playlist/album/artist URL or URI; repeatable "
+                                     "(default: liked songs)")
+    source_options.add_argument('--incremental', action='store_true',
+                                help="Only fetch songs liked since the last sync")
+    
+    # Where the coordinator and its workers share leased songs
+    queue_options = argparse.ArgumentParser(add_help=False)
+    queue_options.add_argument('--queue', metavar='PATH',
+                               help="Work queue database (default: downloaded_music/.work_queue.db); "
+                                    "workers on other hosts need it on a shared filesystem")
+    queue_options.add_argument('--poll', type=float, default=5, help="Seconds between queue checks")
+    
+    sync = commands.add_parser('sync', parents=[download_options, source_options],
+                               help="Download new songs from the selected sources (default command)")
+    sync.add_argument('--retry-failed', action='store_true',
+                      help="Same as the retry-failed command")
+    commands.add_parser('retry-failed', parents=[download_options],
+                        help="Only retry previously failed songs whose backoff has elapsed")
+    commands.add_parser('status', help="Show the library, retry queue and last run (no network access)")
+    verify = commands.add_parser('verify', help="Check that every downloaded track is still on disk")
+    verify.add_argument('--fix', action='store_true',
+                        help="Forget missing tracks so the next sync downloads them again")
+    coordinate = commands.add_parser('coordinate', parents=[source_options, queue_options],
+                                     help="Queue the songs a sync would download for 'work' processes")
+    coordinate.add_argument('--wait', action='store_true',
+                            help="Stay running and report progress until the queue is drained")
+    work = commands.add_parser('work', parents=[download_options, queue_options],
+                               help="Download songs leased from a coordinator's work queue")
+    work.add_argument('--worker-id', help="Name in the queue (default: hostname-pid)")
+    work.add_argument('--batch', type=int, help="Songs leased per claim (default: 2 x workers)")
+    work.add_argument('--lease', type=float, default=DEFAULT_LEASE_SECONDS,
+                      help="Seconds a lease lasts without a heartbeat")
+    work.add_argument('--follow', action='store_true',
+                      help="Keep waiting for new songs instead of exiting when the queue is empty")
+    return parser
 
-def main():
+
+def main(argv=None):
+    argv = list(sys.argv[1:] if argv is None else argv)
+    # No command means sync, so the flags from before the subcommands keep working
+    if not argv or (argv[0] not in COMMANDS and argv[0] not in ('-h', '--help')):
+        argv.insert(0, 'sync')
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    
+    if args.command == 'status':
+        UltimateSpotifyDownloader().print_status()
+        return
+    if args.command == 'verify':
+        UltimateSpotifyDownloader().verify_library(fix=args.fix)
+        return
+    
+    sources = None
+    if args.command in ('sync', 'coordinate'):
+        try:
+            sources = [parse_source(source) for source in args.sources or ['liked']]
+        except ValueError as e:
+            parser.error(str(e))
+    
     print("🎵 Ultimate Spotify Downloader - Fixed Version")
     print("=" * 50)
     print("🔧 This version fixes YouTube auth issues and crashes")
     print("📱 Audio-only mode for maximum stability\n")
     
-    downloader = UltimateSpotifyDownloader()
-    downloader.download_all()
+    if args.command == 'coordinate':
+        downloader = UltimateSpotifyDownloader(incremental=args.incremental, sources=sources)
+        downloader.coordinate(args.queue, wait=args.wait, poll=args.poll)
+        return
+    
+    downloader = UltimateSpotifyDownloader(workers=args.workers,
+                                           incremental=getattr(args, 'incremental', False),
+                                           refresh_search=args.refresh_search,
+                                           link_duplicates=args.link_duplicates, sources=sources,
+                                           converter=args.converter, remux_only=args.remux_only)
+    if not downloader.check_converter():
+        sys.exit(2)
+    if args.command == 'work':
+        downloader.run_worker(args.queue, worker_id=args.worker_id, batch=args.batch,
+                              lease_seconds=args.lease, follow=args.follow, poll=args.poll)
+    elif args.command == 'retry-failed' or args.retry_failed:
+        downloader.retry_failed()
+    else:
+        downloader.download_all()
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
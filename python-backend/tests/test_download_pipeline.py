@@ -0,0 +1,69 @@
+#!/usr/bin/env python3
+"""Download pipeline draining, stopping and callback failures"""
+
+import os
+import sys
+import threading
+import unittest
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+from download_pipeline import DownloadPipeline, PipelineStage
+
+
+def run_with_timeout(pipeline, items, timeout=10):
+    """Run the pipeline on a thread; True if it drained within `timeout`"""
+    runner = threading.Thread(target=pipeline.run, args=(items,), daemon=True)
+    runner.start()
+    runner.join(timeout)
+    if runner.is_alive():
+        pipeline.stop()
+        return False
+    return True
+
+
+class DownloadPipelineTest(unittest.TestCase):
+    def test_every_item_is_reported_once(self):
+        done = []
+        stages = [PipelineStage('first', lambda item: True, 2),
+                  PipelineStage('second', lambda item: item % 3 != 0, 2)]
+        pipeline = DownloadPipeline(stages, queue_size=2, on_done=lambda item, error: done.append(item))
+        self.assertTrue(run_with_timeout(pipeline, range(50)))
+        self.assertEqual(sorted(done), list(range(50)))
+
+    def test_stage_errors_are_reported(self):
+        errors = {}
+
+        def stage(item):
+            if item == 3:
+                raise ValueError("bad item")
+            return True
+
+        pipeline = DownloadPipeline([PipelineStage('only', stage)],
+                                    on_done=lambda item, error: errors.__setitem__(item, error))
+        self.assertTrue(run_with_timeout(pipeline, range(5)))
+        self.assertIsInstance(errors.pop(3), ValueError)
+        self.assertEqual(errors, dict.fromkeys([0, 1, 2, 4]))
+
+    def test_failing_callback_does_not_stall_the_pipeline(self):
+        # One thread per stage and a small queue: a dead last-stage worker
+        # would leave the first stage blocked on a full queue forever
+        done = []
+        failed = []
+
+        def on_done(item, error):
+            if not failed:
+                failed.append(item)
+                raise RuntimeError("database is locked")
+            done.append(item)
+
+        stages = [PipelineStage('first', lambda item: True, 1),
+                  PipelineStage('second', lambda item: True, 1)]
+        pipeline = DownloadPipeline(stages, queue_size=1, on_done=on_done)
+        self.assertTrue(run_with_timeout(pipeline, range(20)))
+        self.assertEqual(sorted(done + failed), list(range(20)))
+
+
+if __name__ == '__main__':
+    unittest.main()
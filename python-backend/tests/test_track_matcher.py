@@ -0,0 +1,52 @@
+#!/usr/bin/env python3
+"""Track matcher scoring, replayed against recorded YouTube search results"""
+
+import json
+import os
+import sys
+import unittest
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+from track_matcher import DEFAULT_THRESHOLD, rank_candidates, score_candidate, tokenize
+
+FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures')
+
+
+def load_recorded_searches():
+    with open(os.path.join(FIXTURES, 'recorded_searches.json'), encoding='utf-8') as f:
+        return json.load(f)
+
+
+class TokenizeTest(unittest.TestCase):
+    def test_strips_accents_and_case(self):
+        self.assertEqual(tokenize("Déjà VU (Remix)"), ['deja', 'vu', 'remix'])
+
+    def test_keeps_non_latin_scripts(self):
+        self.assertEqual(tokenize("Кино - Звезда"), ['кино', 'звезда'])
+        self.assertEqual(tokenize("YOASOBI「夜に駆ける」"), ['yoasobi', '夜に駆ける'])
+
+    def test_underscores_separate_tokens(self):
+        self.assertEqual(tokenize("song_name__2"), ['song', 'name', '2'])
+
+
+class RecordedSearchTest(unittest.TestCase):
+    def test_best_candidate(self):
+        for search in load_recorded_searches():
+            with self.subTest(search['case']):
+                ranked = rank_candidates(search['track'], search['candidates'])
+                best = ranked[0][1]['id'] if ranked else None
+                self.assertEqual(best, search['expected'])
+
+    def test_exact_match_clears_threshold_in_any_script(self):
+        for search in load_recorded_searches():
+            if search['expected'] is None:
+                continue
+            expected = next(c for c in search['candidates'] if c['id'] == search['expected'])
+            with self.subTest(search['case']):
+                self.assertGreaterEqual(score_candidate(search['track'], expected), DEFAULT_THRESHOLD)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,181 @@
+#!/usr/bin/env python3
+"""
+Track Matcher - score YouTube search results against Spotify metadata
+Pure functions over metadata only (no network, no yt-dlp), so candidates
+are ranked and rejected before anything is downloaded and the scoring can
+be replayed offline against recorded search results.
+
+A track is any mapping with 'name', 'artist' and 'duration' (milliseconds).
+A candidate is a yt-dlp search entry: 'title', 'duration' (seconds),
+'channel'/'uploader' and optionally 'channel_is_verified'.
+"""
+
+import re
+import unicodedata
+
+# Candidates scoring below this are never downloaded
+DEFAULT_THRESHOLD = 0.5
+
+# Duration difference (seconds) that still counts as a perfect match
+DURATION_TOLERANCE = 3
+# Difference at which the duration score reaches zero
+DURATION_CUTOFF = 30
+# Reject outright when the candidate is this far off (seconds or ratio)
+DURATION_REJECT_SECONDS = 60
+DURATION_REJECT_RATIO = 0.5
+
+WEIGHTS = {
+    'duration': 0.45,
+    'title': 0.35,
+    'artist': 0.20,
+}
+TOPIC_CHANNEL_BONUS = 0.15
+ARTIST_CHANNEL_BONUS = 0.10
+VERIFIED_CHANNEL_BONUS = 0.05
+VARIANT_PENALTY = 0.30
+
+# Words that decorate upload titles without saying anything about the song
+FILLER_TOKENS = {
+    'official', 'video', 'audio', 'lyric', 'lyrics', 'hd', 'hq', '4k', 'mv',
+    'music', 'visualizer', 'visualiser', 'ft', 'feat', 'featuring', 'topic',
+    'version', 'original', 'explicit', 'clean', 'remastered', 'remaster',
+}
+
+# Words that mark a different recording unless the Spotify title has them
+VARIANT_TOKENS = {
+    'live', 'cover', 'karaoke', 'instrumental', 'remix', 'nightcore', 'sped',
+    'slowed', 'reverb', '8d', 'acoustic', 'mashup', 'reaction', 'tutorial',
+    'boosted', 'loop', 'hour', 'hours', 'compilation', 'playlist',
+}
+
+# Letters and digits of any script; `_` is a word character but no token
+_TOKEN_RE = re.compile(r"[^\W_]+")
+
+
+def tokenize(text):
+    """Case-folded, accent-stripped word tokens of `text` in any script"""
+    if not text:
+        return []
+    text = unicodedata.normalize('NFKD', str(text))
+    text = ''.join(ch for ch in text if not unicodedata.combining(ch))
+    return _TOKEN_RE.findall(text.casefold())
+
+
+def primary_artist(artist):
+    """First artist of a comma-separated Spotify artist string"""
+    return (artist or '').split(',')[0].strip()
+
+
+def duration_score(expected_ms, candidate_seconds):
+    """1.0 within DURATION_TOLERANCE, falling linearly to 0 at DURATION_CUTOFF.
+
+    Unknown durations score a neutral 0.5.
+    """
+    if not expected_ms or not candidate_seconds:
+        return 0.5
+    diff = abs(expected_ms / 1000.0 - float(candidate_seconds))
+    if diff <= DURATION_TOLERANCE:
+        return 1.0
+    if diff >= DURATION_CUTOFF:
+        return 0.0
+    return 1.0 - (diff - DURATION_TOLERANCE) / (DURATION_CUTOFF - DURATION_TOLERANCE)
+
+
+def duration_rejected(expected_ms, candidate_seconds):
+    """True for candidates that cannot be the track (mixes, loops, snippets)"""
+    if not expected_ms or not candidate_seconds:
+        return False
+    expected = expected_ms / 1000.0
+    diff = abs(expected - float(candidate_seconds))
+    return diff > max(DURATION_REJECT_SECONDS, expected * DURATION_REJECT_RATIO)
+
+
+def title_similarity(track_name, artist, candidate_title):
+    """How well the candidate title covers the track name (0..1).
+
+    Mostly recall of the track-name tokens, with a smaller precision term
+    so titles padded with unrelated words rank lower.
+    """
+    name_tokens = set(tokenize(track_name)) - FILLER_TOKENS
+    if not name_tokens:
+        return 0.0
+    title_tokens = set(tokenize(candidate_title)) - FILLER_TOKENS
+    if not title_tokens:
+        return 0.0
+    recall = len(name_tokens & title_tokens) / len(name_tokens)
+    expected = name_tokens | set(tokenize(artist))
+    precision = len(title_tokens & expected) / len(title_tokens)
+    return 0.7 * recall + 0.3 * precision
+
+
+def artist_similarity(artist, candidate):
+    """Share of the primary artist's tokens found in the title or channel"""
+    artist_tokens = set(tokenize(primary_artist(artist)))
+    if not artist_tokens:
+        return 0.0
+    found = set(tokenize(candidate.get('title')))
+    found.update(tokenize(candidate_channel(candidate)))
+    return len(artist_tokens & found) / len(artist_tokens)
+
+
+def candidate_channel(candidate):
+    return candidate.get('channel') or candidate.get('uploader') or ''
+
+
+def channel_bonus(artist, candidate):
+    """Bonus for auto-generated "Artist - Topic" and official artist channels"""
+    channel = candidate_channel(candidate)
+    bonus = 0.0
+    artist_tokens = tokenize(primary_artist(artist))
+    channel_tokens = tokenize(channel)
+    if channel.endswith(' - Topic'):
+        if artist_tokens and tokenize(channel[:-len(' - Topic')]) == artist_tokens:
+            bonus += TOPIC_CHANNEL_BONUS
+    elif artist_tokens and channel_tokens:
+        joined = ''.join(channel_tokens)
+        name = ''.join(artist_tokens)
+        if joined in (name, name + 'vevo', name + 'official', 'official' + name):
+            bonus += ARTIST_CHANNEL_BONUS
+    if candidate.get('channel_is_verified'):
+        bonus += VERIFIED_CHANNEL_BONUS
+    return bonus
+
+
+def variant_penalty(track_name, candidate_title):
+    """Penalty for live/cover/remix/... uploads of a studio track"""
+    wanted = set(tokenize(track_name))
+    extra = (set(tokenize(candidate_title)) & VARIANT_TOKENS) - wanted
+    return VARIANT_PENALTY * len(extra)
+
+
+def score_candidate(track, candidate):
+    """Score one candidate for `track`; higher is better, 0 is hopeless.
+
+    A perfect title/artist/duration match scores 1.0; channel bonuses can
+    lift it slightly above that to break ties between good uploads.
+    """
+    expected_ms = track.get('duration')
+    if duration_rejected(expected_ms, candidate.get('duration')):
+        return 0.0
+
+    name = track.get('name') or ''
+    artist = track.get('artist') or ''
+    title = candidate.get('title') or ''
+
+    score = (
+        WEIGHTS['duration'] * duration_score(expected_ms, candidate.get('duration'))
+        + WEIGHTS['title'] * title_similarity(name, artist, title)
+        + WEIGHTS['artist'] * artist_similarity(artist, candidate)
+        + channel_bonus(artist, candidate)
+        - variant_penalty(name, title)
+    )
+    return max(0.0, score)
+
+
+def rank_candidates(track, candidates, threshold=DEFAULT_THRESHOLD):
+    """Return [(score, candidate)] best-first, dropping those below threshold"""
+    scored = [(score_candidate(track, candidate), candidate) for candidate in candidates or []]
+    ranked = [pair for pair in scored if pair[0] >= threshold]
+    # Stable sort keeps YouTube's order between equal scores
+    ranked.sort(key=lambda pair: pair[0], reverse=True)
+    return ranked
@@ -0,0 +1,226 @@
+#!/usr/bin/env python3
+"""
+Track Sources - compact track records produced by the Spotify sources
+Records are slotted so a large library streams through the downloader
+without one dict per track. Playlists, albums and artist discographies
+are listed by ID and resolved through Spotify's batch endpoints.
+"""
+
+import re
+
+
+def normalize_isrc(isrc):
+    """Canonical ISRC form (upper case, no hyphens), or None"""
+    if not isrc:
+        return None
+    return str(isrc).replace('-', '').strip().upper() or None
+
+
+class TrackRecord:
+    """Metadata for one Spotify track.
+
+    Supports read-only mapping access (`track['name']`, `track.get(...)`)
+    so code written against the old song_info dicts keeps working.
+    """
+
+    __slots__ = ('spotify_id', 'name', 'artist', 'album', 'duration',
+                 'album_art_url', 'added_at', 'album_id', 'isrc')
+
+    def __init__(self, spotify_id, name, artist, album, duration=None,
+                 album_art_url=None, added_at=None, album_id=None, isrc=None):
+        self.spotify_id = spotify_id
+        self.name = name
+        self.artist = artist
+        self.album = album
+        self.duration = duration
+        self.album_art_url = album_art_url
+        self.added_at = added_at
+        self.album_id = album_id
+        self.isrc = isrc  # Identifies the recording across singles, albums and compilations
+
+    @classmethod
+    def from_api(cls, track, added_at=None):
+        """Build a record from a Spotify API track object"""
+        album = track.get('album') or {}
+        images = album.get('images') or []
+        return cls(
+            spotify_id=track.get('id'),
+            name=track['name'],
+            artist=', '.join(artist['name'] for artist in track.get('artists') or []),
+            album=album.get('name', ''),
+            duration=track.get('duration_ms'),
+            # Spotify provides images in descending order of size
+            album_art_url=images[0]['url'] if images else None,
+            added_at=added_at,
+            album_id=album.get('id'),
+            isrc=normalize_isrc((track.get('external_ids') or {}).get('isrc')),
+        )
+
+    @classmethod
+    def coerce(cls, song_info):
+        """Accept either a TrackRecord or a legacy song_info dict"""
+        if isinstance(song_info, cls):
+            return song_info
+        return cls(**{key: song_info.get(key) for key in cls.__slots__})
+
+    def __getitem__(self, key):
+        try:
+            return getattr(self, key)
+        except (AttributeError, TypeError):
+            raise KeyError(key)
+
+    def get(self, key, default=None):
+        return getattr(self, key, default)
+
+    def to_dict(self):
+        return {key: getattr(self, key) for key in self.__slots__}
+
+    def __repr__(self):
+        return f"TrackRecord({self.spotify_id!r}, {self.artist!r} - {self.name!r})"
+
+
+# Spotify batch endpoint limits
+TRACKS_BATCH = 50
+ALBUMS_BATCH = 20
+PLAYLIST_PAGE = 100
+ALBUM_TRACKS_PAGE = 50
+ARTIST_ALBUMS_PAGE = 50
+
+SOURCE_KINDS = ('liked', 'playlist', 'album', 'artist')
+
+_SOURCE_RE = re.compile(
+    r'^(?:spotify:|https?://open\.spotify\.com/(?:intl-[a-z-]+/)?|)'
+    r'(playlist|album|artist)[:/]([A-Za-z0-9]+)'
+)
+
+
+def parse_source(text):
+    """Parse 'liked' or a Spotify playlist/album/artist URL, URI or
+    'kind:id' into (kind, id); raises ValueError otherwise"""
+    text = text.strip()
+    if text.lower() in ('liked', 'liked-songs', 'saved'):
+        return 'liked', None
+    match = _SOURCE_RE.match(text)
+    if not match:
+        raise ValueError(f"Not a Spotify playlist, album or artist: {text}")
+    return match.group(1), match.group(2)
+
+
+def chunked(items, size):
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+class SpotifyCatalog:
+    """Track sources for one run, sharing batched metadata lookups.
+
+    Sources only list track IDs; IDs not seen earlier in the run are
+    buffered and resolved 50 at a time through the `tracks` endpoint, so
+    overlapping playlists cost requests per unique track rather than per
+    playlist entry. `call(func, *args, **kwargs)` wraps every API request
+    (the downloader passes its rate-limited spotify_call).
+    """
+
+    def __init__(self, spotify, call=None):
+        self.spotify = spotify
+        self.call = call or (lambda func, *args, **kwargs: func(*args, **kwargs))
+        self.seen = set()
+        self.requests = 0
+
+    def _request(self, func, *args, **kwargs):
+        self.requests += 1
+        return self.call(func, *args, **kwargs)
+
+    def claim(self, tracks):
+        """Drop TrackRecords already produced in this run and mark the rest"""
+        fresh = []
+        for track in tracks:
+            if track.spotify_id and track.spotify_id in self.seen:
+                continue
+            self.seen.add(track.spotify_id)
+            fresh.append(track)
+        return fresh
+
+    def resolve(self, id_pages):
+        """Yield pages of TrackRecords for the unseen IDs in `id_pages`"""
+        buffer = []
+        for ids in id_pages:
+            for track_id in ids:
+                if track_id and track_id not in self.seen:
+                    self.seen.add(track_id)
+                    buffer.append(track_id)
+            while len(buffer) >= TRACKS_BATCH:
+                batch, buffer = buffer[:TRACKS_BATCH], buffer[TRACKS_BATCH:]
+                yield self._tracks(batch)
+        if buffer:
+            yield self._tracks(buffer)
+
+    def _tracks(self, ids):
+        response = self._request(self.spotify.tracks, ids)
+        return [TrackRecord.from_api(track) for track in response.get('tracks') or [] if track]
+
+    def playlist_track_ids(self, playlist_id):
+        """Yield the track IDs of a playlist, one page at a time"""
+        offset = 0
+        while True:
+            page = self._request(
+                self.spotify.playlist_items, playlist_id,
+                fields='items(track(id,type,is_local)),next',
+                limit=PLAYLIST_PAGE, offset=offset, additional_types=('track',),
+            )
+            items = page.get('items') or []
+            yield [
+                item['track']['id'] for item in items
+                if item.get('track') and item['track'].get('type', 'track') == 'track'
+                and not item['track'].get('is_local')
+            ]
+            if not page.get('next') or not items:
+                return
+            offset += len(items)
+
+    def album_track_ids(self, album_ids):
+        """Yield the track IDs of each album, fetching albums 20 at a time"""
+        for batch in chunked(list(album_ids), ALBUMS_BATCH):
+            response = self._request(self.spotify.albums, batch)
+            for album in response.get('albums') or []:
+                if not album:
+                    continue
+                tracks = album.get('tracks') or {}
+                items = list(tracks.get('items') or [])
+                # Albums embed their first 50 tracks; page through the rest
+                while tracks.get('next'):
+                    tracks = self._request(self.spotify.album_tracks, album['id'],
+                                           limit=ALBUM_TRACKS_PAGE, offset=len(items))
+                    if not tracks.get('items'):
+                        break
+                    items.extend(tracks['items'])
+                yield [track.get('id') for track in items]
+
+    def artist_album_ids(self, artist_id, include_groups='album,single'):
+        """All album IDs in an artist's discography"""
+        album_ids = []
+        offset = 0
+        while True:
+            page = self._request(self.spotify.artist_albums, artist_id, include_groups=include_groups,
+                                 limit=ARTIST_ALBUMS_PAGE, offset=offset)
+            items = page.get('items') or []
+            for album in items:
+                if album.get('id') and album['id'] not in album_ids:
+                    album_ids.append(album['id'])
+            if not page.get('next') or not items:
+                return album_ids
+            offset += len(items)
+
+    def iter_pages(self, kind, source_id):
+        """Yield pages of new TrackRecords from a playlist, album or artist"""
+        if kind == 'playlist':
+            id_pages = self.playlist_track_ids(source_id)
+        elif kind == 'album':
+            id_pages = self.album_track_ids([source_id])
+        elif kind == 'artist':
+            id_pages = self.album_track_ids(self.artist_album_ids(source_id))
+        else:
+            raise ValueError(f"Unknown source kind: {kind}")
+        for page in self.resolve(id_pages):
+            if page:
+                yield page
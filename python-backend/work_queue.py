@@ -0,0 +1,315 @@
+#!/usr/bin/env python3
+"""
+Work Queue - leased track downloads shared by several worker processes
+A coordinator enqueues the tracks a sync still needs; workers (on this
+machine or others sharing the folder) claim small batches under a lease,
+heartbeat while they work and commit each result. A lease that is not
+renewed in time expires and its tracks go back to the queue, so a crashed
+worker delays its tracks instead of losing them, and a track is only ever
+held by one worker at a time.
+"""
+
+import json
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+
+from run_metrics import MetricsHook
+
+DEFAULT_LEASE_SECONDS = 300
+DEFAULT_MAX_CLAIMS = 3  # Expired leases before a track is failed instead of handed out again
+
+# Failure reason for a track whose lease expired and went to another worker
+LEASE_LOST = 'lease_lost'
+
+STATES = ('pending', 'leased', 'done', 'failed')
+
+
+class WorkQueue:
+    """SQLite-backed queue of tracks with per-worker leases.
+
+    Uses a rollback journal rather than WAL: WAL's shared-memory index only
+    works for processes on one host, and claims are small and infrequent
+    next to the downloads they hand out. Every state change runs in an
+    IMMEDIATE transaction, so two workers never claim the same track.
+    """
+
+    def __init__(self, db_path, lease_seconds=DEFAULT_LEASE_SECONDS, max_claims=DEFAULT_MAX_CLAIMS):
+        self.db_path = db_path
+        self.lease_seconds = lease_seconds
+        self.max_claims = max_claims
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(db_path, check_same_thread=False, timeout=60, isolation_level=None)
+        self._conn.row_factory = sqlite3.Row
+        with self._transaction() as conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS work_items (
+                    spotify_id TEXT PRIMARY KEY,
+                    track TEXT NOT NULL,
+                    isrc TEXT,
+                    state TEXT NOT NULL,
+                    worker TEXT,
+                    lease_expires_at REAL,
+                    claims INTEGER NOT NULL DEFAULT 0,
+                    result TEXT,
+                    enqueued_at REAL NOT NULL,
+                    updated_at REAL NOT NULL
+                )
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS work_items_state ON work_items (state, lease_expires_at)")
+            conn.execute("CREATE INDEX IF NOT EXISTS work_items_isrc ON work_items (isrc)")
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    @contextmanager
+    def _transaction(self):
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield self._conn
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+            self._conn.execute("COMMIT")
+
+    @staticmethod
+    def _in(column, values):
+        return f"{column} IN ({', '.join('?' * len(values))})"
+
+    def enqueue(self, tracks, now=None):
+        """Queue TrackRecords (or song_info dicts) with a Spotify ID. Tracks
+        already pending or leased are left alone; finished ones are queued
+        again. Returns the number of tracks queued."""
+        now = time.time() if now is None else now
+        rows = []
+        for track in tracks:
+            track_dict = track.to_dict() if hasattr(track, 'to_dict') else dict(track)
+            if track_dict.get('spotify_id'):
+                rows.append((track_dict['spotify_id'], json.dumps(track_dict), track_dict.get('isrc')))
+        if not rows:
+            return 0
+        with self._transaction() as conn:
+            requeued = conn.executemany(
+                "UPDATE work_items SET track = ?, isrc = ?, state = 'pending', worker = NULL, "
+                "lease_expires_at = NULL, claims = 0, result = NULL, updated_at = ? "
+                "WHERE spotify_id = ? AND state IN ('done', 'failed')",
+                ((track_json, isrc, now, spotify_id) for spotify_id, track_json, isrc in rows),
+            ).rowcount
+            added = conn.executemany(
+                "INSERT OR IGNORE INTO work_items "
+                "(spotify_id, track, isrc, state, enqueued_at, updated_at) "
+                "VALUES (?, ?, ?, 'pending', ?, ?)",
+                ((spotify_id, track_json, isrc, now, now) for spotify_id, track_json, isrc in rows),
+            ).rowcount
+        return max(requeued, 0) + max(added, 0)
+
+    def _expire(self, conn, now):
+        """Return expired leases to the queue (or fail tracks that keep
+        expiring); returns the number of tracks reclaimed"""
+        conn.execute(
+            "UPDATE work_items SET state = 'failed', result = ?, worker = NULL, "
+            "lease_expires_at = NULL, updated_at = ? "
+            "WHERE state = 'leased' AND lease_expires_at < ? AND claims >= ?",
+            (LEASE_LOST, now, now, self.max_claims),
+        )
+        return conn.execute(
+            "UPDATE work_items SET state = 'pending', worker = NULL, lease_expires_at = NULL, "
+            "updated_at = ? WHERE state = 'leased' AND lease_expires_at < ?",
+            (now, now),
+        ).rowcount
+
+    def reclaim_expired(self, now=None):
+        """Return expired leases to the queue now (claims also do this)"""
+        now = time.time() if now is None else now
+        with self._transaction() as conn:
+            return self._expire(conn, now)
+
+    def claim(self, worker, limit=1, lease_seconds=None, now=None):
+        """Lease up to `limit` pending tracks to `worker`, oldest first.
+
+        Pending tracks sharing an ISRC with a claimed one are leased along
+        with it, so one worker downloads the recording and links the rest.
+        Returns the leased entries.
+        """
+        now = time.time() if now is None else now
+        expires = now + (lease_seconds or self.lease_seconds)
+        with self._transaction() as conn:
+            self._expire(conn, now)
+            rows = conn.execute(
+                "SELECT * FROM work_items WHERE state = 'pending' ORDER BY rowid LIMIT ?", (limit,)
+            ).fetchall()
+            isrcs = sorted({row['isrc'] for row in rows if row['isrc']})
+            if isrcs:
+                rows += conn.execute(
+                    "SELECT * FROM work_items WHERE state = 'pending' AND " + self._in('isrc', isrcs),
+                    isrcs,
+                ).fetchall()
+            claimed = {}
+            for row in rows:
+                claimed.setdefault(row['spotify_id'], row)
+            ids = list(claimed)
+            if ids:
+                conn.execute(
+                    "UPDATE work_items SET state = 'leased', worker = ?, lease_expires_at = ?, "
+                    "claims = claims + 1, updated_at = ? WHERE " + self._in('spotify_id', ids),
+                    [worker, expires, now, *ids],
+                )
+        return [self._entry(row) for row in claimed.values()]
+
+    def heartbeat(self, worker, spotify_ids, lease_seconds=None, now=None):
+        """Extend `worker`'s leases on `spotify_ids`; returns the IDs it still
+        holds (a missing ID expired and was claimed elsewhere)"""
+        spotify_ids = list(spotify_ids)
+        if not spotify_ids:
+            return set()
+        now = time.time() if now is None else now
+        expires = now + (lease_seconds or self.lease_seconds)
+        held = set()
+        with self._transaction() as conn:
+            # Stay well below SQLite's bound-parameter limit
+            for start in range(0, len(spotify_ids), 500):
+                chunk = spotify_ids[start:start + 500]
+                conn.execute(
+                    "UPDATE work_items SET lease_expires_at = ?, updated_at = ? "
+                    "WHERE state = 'leased' AND worker = ? AND " + self._in('spotify_id', chunk),
+                    [expires, now, worker, *chunk],
+                )
+                held.update(row[0] for row in conn.execute(
+                    "SELECT spotify_id FROM work_items "
+                    "WHERE state = 'leased' AND worker = ? AND " + self._in('spotify_id', chunk),
+                    [worker, *chunk],
+                ))
+        return held
+
+    def commit(self, worker, spotify_id, ok, result=None, now=None):
+        """Record the outcome of a leased track; returns False (and changes
+        nothing) if `worker` no longer holds the lease"""
+        now = time.time() if now is None else now
+        with self._transaction() as conn:
+            cursor = conn.execute(
+                "UPDATE work_items SET state = ?, result = ?, lease_expires_at = NULL, updated_at = ? "
+                "WHERE spotify_id = ? AND state = 'leased' AND worker = ?",
+                ('done' if ok else 'failed', result, now, spotify_id, worker),
+            )
+        return cursor.rowcount == 1
+
+    def release(self, worker, spotify_ids, now=None):
+        """Hand leased tracks back to the queue without a result"""
+        spotify_ids = list(spotify_ids)
+        if not spotify_ids:
+            return 0
+        now = time.time() if now is None else now
+        with self._transaction() as conn:
+            return conn.execute(
+                "UPDATE work_items SET state = 'pending', worker = NULL, lease_expires_at = NULL, "
+                "claims = MAX(claims - 1, 0), updated_at = ? "
+                "WHERE state = 'leased' AND worker = ? AND " + self._in('spotify_id', spotify_ids),
+                [now, worker, *spotify_ids],
+            ).rowcount
+
+    def stats(self, worker=None, now=None):
+        """Track counts per state, plus expired leases, active workers and
+        (with `worker`) the leases held by other workers"""
+        now = time.time() if now is None else now
+        with self._lock:
+            counts = dict.fromkeys(STATES, 0)
+            for row in self._conn.execute("SELECT state, COUNT(*) FROM work_items GROUP BY state"):
+                counts[row[0]] = row[1]
+            row = self._conn.execute(
+                "SELECT "
+                "COALESCE(SUM(CASE WHEN lease_expires_at < ? THEN 1 ELSE 0 END), 0), "
+                "COUNT(DISTINCT worker), "
+                "COALESCE(SUM(CASE WHEN worker IS NOT ? THEN 1 ELSE 0 END), 0) "
+                "FROM work_items WHERE state = 'leased'",
+                (now, worker),
+            ).fetchone()
+        counts.update(expired=row[0], workers=row[1], leased_elsewhere=row[2])
+        return counts
+
+    @staticmethod
+    def _entry(row):
+        entry = dict(row)
+        entry['track'] = json.loads(entry['track'])
+        return entry
+
+
+class LeaseKeeper:
+    """Renews one worker's leases from a background thread and commits
+    results, refusing to commit tracks whose lease was lost"""
+
+    def __init__(self, queue, worker_id, lease_seconds=None, interval=None):
+        self.queue = queue
+        self.worker_id = worker_id
+        self.lease_seconds = lease_seconds or queue.lease_seconds
+        # Three renewals per lease, so one slow heartbeat does not lose it
+        self.interval = interval or self.lease_seconds / 3
+        self.lost = set()
+        self._held = set()
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="lease-heartbeat", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def add(self, spotify_ids):
+        with self._lock:
+            self._held.update(spotify_ids)
+
+    def held(self):
+        """IDs leased to this worker that have no result yet"""
+        with self._lock:
+            return set(self._held)
+
+    def holds(self, spotify_id):
+        """False once the lease on `spotify_id` went to another worker"""
+        with self._lock:
+            return spotify_id not in self.lost
+
+    def commit(self, spotify_id, ok, result=None):
+        with self._lock:
+            if spotify_id not in self._held:
+                return False
+            self._held.discard(spotify_id)
+        return self.queue.commit(self.worker_id, spotify_id, ok, result)
+
+    def release(self, spotify_ids):
+        spotify_ids = list(spotify_ids)
+        with self._lock:
+            self._held.difference_update(spotify_ids)
+        return self.queue.release(self.worker_id, spotify_ids)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            ids = self.held()
+            try:
+                still_held = self.queue.heartbeat(self.worker_id, ids, self.lease_seconds)
+            except sqlite3.Error as e:
+                print(f"⚠️  Lease heartbeat failed: {e}")
+                continue
+            lost = ids - still_held
+            if lost:
+                with self._lock:
+                    self._held -= lost
+                    self.lost |= lost
+                print(f"⚠️  Lost the lease on {len(lost)} tracks; another worker has them now")
+
+
+class WorkQueueHook(MetricsHook):
+    """Commits each finished track to the work queue"""
+
+    def __init__(self, keeper):
+        self.keeper = keeper
+
+    def on_track(self, track_id, ok, reason, seconds):
+        self.keeper.commit(track_id, ok, None if ok else reason)
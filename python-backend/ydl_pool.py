@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+"""
+YoutubeDL Pool - long-lived, per-worker yt-dlp instances
+Building a YoutubeDL reloads every extractor and opens a new HTTP session,
+so each worker thread keeps one pre-configured instance per profile
+(search, download, fallback download) and reuses it across tracks.
+Instances are recycled after a fixed number of uses or after any error.
+"""
+
+import threading
+from contextlib import contextmanager
+
+# Uses before an instance is rebuilt to shed accumulated state
+DEFAULT_MAX_USES = 200
+
+
+class YoutubeDLPool:
+    """Thread-local YoutubeDL instances keyed by profile name.
+
+    `factory(options)` builds an instance (normally `yt_dlp.YoutubeDL`), so
+    this module never imports yt-dlp itself.
+    """
+
+    def __init__(self, factory, max_uses=DEFAULT_MAX_USES):
+        self.factory = factory
+        self.max_uses = max_uses
+        self.created = 0
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._all = []
+
+    def _slots(self):
+        slots = getattr(self._local, 'slots', None)
+        if slots is None:
+            slots = self._local.slots = {}
+        return slots
+
+    @contextmanager
+    def acquire(self, name, options_factory):
+        """Yield this thread's `name` instance, building it on first use.
+
+        `options_factory()` is only called when a new instance is needed.
+        An instance that raises is discarded rather than reused.
+        """
+        slots = self._slots()
+        slot = slots.get(name)
+        if slot is None:
+            ydl = self.factory(options_factory())
+            slot = slots[name] = [ydl, 0]
+            with self._lock:
+                self.created += 1
+                self._all.append(ydl)
+
+        try:
+            yield slot[0]
+        except BaseException:
+            self.discard(name)
+            raise
+
+        slot[1] += 1
+        if slot[1] >= self.max_uses:
+            self.discard(name)
+
+    def discard(self, name):
+        """Close and forget this thread's `name` instance"""
+        slot = self._slots().pop(name, None)
+        if slot is not None:
+            with self._lock:
+                if slot[0] in self._all:
+                    self._all.remove(slot[0])
+            _close(slot[0])
+
+    def close_all(self):
+        """Close every instance; only call once all workers are idle"""
+        with self._lock:
+            instances, self._all = self._all, []
+        for ydl in instances:
+            _close(ydl)
+        self._local = threading.local()
+
+
+def _close(ydl):
+    try:
+        ydl.__exit__(None, None, None)
+    except Exception:
+        pass
+
+
+def set_output_template(ydl, template):
+    """Point a reused instance at a new output file template"""
+    outtmpl = ydl.params.get('outtmpl')
+    if isinstance(outtmpl, dict):
+        outtmpl['default'] = template
+    else:
+        ydl.params['outtmpl'] = template